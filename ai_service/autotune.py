@@ -0,0 +1,235 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from PIL import Image
+
+import main
+from tuning import TUNING_PATH
+
+
+# =========================
+# Inference node autotuner
+# =========================
+# Sweeps worker processes x torch intra-op threads x batch size for both
+# models the way gunicorn.conf.py runs them: models are loaded once, workers
+# are forked and each worker captions/classifies its share of the sample
+# images in batches. Every setting reports throughput and p99 batch latency;
+# the best combination is written to AI_TUNING_PATH for the service to use.
+#
+#   python autotune.py --images data/samples --workers 1,2,4 --threads 1,2,4
+#
+# Run it on the inference node itself while it is otherwise idle.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_images(folder):
+    paths = []
+    for root, _, names in os.walk(folder):
+        paths.extend(
+            os.path.join(root, name) for name in names
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    return [Image.open(path).convert("RGB") for path in sorted(paths)]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_runner(model):
+    if model == "validate":
+        return main.validator.generate_captions
+    return lambda images: main.detector.predict_batch([main.PREPROCESS(image) for image in images])
+
+
+def _worker(model, images, threads, batch_size, barrier, results, timeout):
+    try:
+        main.set_torch_threads(threads)
+        run = make_runner(model)
+        run(images[:batch_size])
+
+        barrier.wait(timeout)
+        latencies = []
+        start = time.perf_counter()
+        for i in range(0, len(images), batch_size):
+            batch_start = time.perf_counter()
+            run(images[i:i + batch_size])
+            latencies.append((time.perf_counter() - batch_start) * 1000)
+        results.put((latencies, start, time.perf_counter()))
+    except Exception as e:
+        # Reported as a string so the parent fails this setting at once
+        results.put(f"{type(e).__name__}: {e}")
+        raise
+
+
+def measure(model, images, workers, threads, batch_size, timeout=600):
+    """Fork ``workers`` processes that share the loaded models and time them.
+
+    A worker that raises, crashes or does not finish within ``timeout``
+    seconds fails the setting: the row gets a ``failed`` reason instead of
+    timings and the remaining workers are terminated.
+    """
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    shares = [images[i::workers] for i in range(workers)]
+    processes = [
+        context.Process(target=_worker, args=(model, share, threads, batch_size, barrier, results, timeout))
+        for share in shares
+    ]
+    for process in processes:
+        process.start()
+
+    outcomes = []
+    error = None
+    deadline = time.monotonic() + timeout
+    while len(outcomes) < len(processes) and error is None:
+        try:
+            outcome = results.get(timeout=1.0)
+        except queue.Empty:
+            crashed = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+            if crashed:
+                error = f"worker exited with code {crashed[0]}"
+            elif time.monotonic() > deadline:
+                error = f"no result within {timeout:g}s"
+            continue
+        if isinstance(outcome, str):
+            error = outcome
+        else:
+            outcomes.append(outcome)
+
+    for process in processes:
+        if error is not None and process.is_alive():
+            process.terminate()
+        process.join()
+        if error is None and process.exitcode != 0:
+            error = f"worker exited with code {process.exitcode}"
+
+    row = {"model": model, "workers": workers, "threads": threads, "batch_size": batch_size}
+    if error is not None:
+        row["failed"] = error
+        return row
+
+    latencies = [latency for outcome in outcomes for latency in outcome[0]]
+    elapsed = max(o[2] for o in outcomes) - min(o[1] for o in outcomes)
+    row.update(
+        images_per_second=len(images) / elapsed,
+        p50_ms=percentile(latencies, 50),
+        p99_ms=percentile(latencies, 99)
+    )
+    return row
+
+
+def best_setting(results, max_p99_ms):
+    """Pick workers/threads maximising /analyze throughput within the p99 budget.
+
+    /analyze runs both models per image, so for every workers x threads pair
+    the best batch size of each model is combined as 1 / (1/v + 1/d).
+    """
+    models = sorted({r["model"] for r in results})
+    best = None
+    for workers, threads in sorted({(r["workers"], r["threads"]) for r in results if "failed" not in r}):
+        chosen = {}
+        for model in models:
+            candidates = [
+                r for r in results
+                if r["model"] == model and r["workers"] == workers and r["threads"] == threads
+                and "failed" not in r and (max_p99_ms is None or r["p99_ms"] <= max_p99_ms)
+            ]
+            if candidates:
+                chosen[model] = max(candidates, key=lambda r: r["images_per_second"])
+        if len(chosen) < len(models):
+            continue
+        combined = 1 / sum(1 / row["images_per_second"] for row in chosen.values())
+        if best is None or combined > best[0]:
+            best = (combined, workers, threads, chosen)
+    return best
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Tune workers, torch threads and batch sizes")
+    parser.add_argument("--images", required=True, help="Folder of representative sample images")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--threads", default="1,2,4")
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--requests", type=int, default=32, help="Images processed per setting")
+    parser.add_argument("--max-p99-ms", type=float, help="Ignore settings slower than this at p99")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds allowed per setting before it fails")
+    parser.add_argument("--output", default=TUNING_PATH)
+    args = parser.parse_args(argv)
+
+    samples = load_images(args.images)
+    if not samples:
+        print(f"No images found under {args.images}")
+        return 1
+    images = [samples[i % len(samples)] for i in range(args.requests)]
+    grid = list(itertools.product(
+        [int(v) for v in args.workers.split(",")],
+        [int(v) for v in args.threads.split(",")],
+        [int(v) for v in args.batch_sizes.split(",")]
+    ))
+
+    # Load in this process so the forked workers share the weights, as under gunicorn
+    main.set_torch_threads(None, interop_threads=1)
+    main.validator.load_blip()
+
+    results = []
+    print(f"{'model':<10}{'workers':>8}{'threads':>8}{'batch':>7}{'img/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for model in ("validate", "detect"):
+        if model == "detect" and main.detector.model is None:
+            print("No Stage-2 model found; skipping detect")
+            continue
+        for workers, threads, batch_size in grid:
+            row = measure(model, images, workers, threads, batch_size, args.timeout)
+            results.append(row)
+            if "failed" in row:
+                print(f"{model:<10}{workers:>8}{threads:>8}{batch_size:>7}  FAILED: {row['failed']}")
+                continue
+            print(
+                f"{model:<10}{workers:>8}{threads:>8}{batch_size:>7}"
+                f"{row['images_per_second']:>10.2f}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+            )
+
+    best = best_setting(results, args.max_p99_ms)
+    if best is None:
+        print("No setting met the p99 budget; nothing written")
+        return 1
+
+    combined, workers, threads, chosen = best
+    settings = {
+        "AI_WORKERS": workers,
+        "TORCH_NUM_THREADS": threads,
+        "VALIDATE_MAX_BATCH_SIZE": chosen["validate"]["batch_size"]
+    }
+    if "detect" in chosen:
+        settings["DETECT_MAX_BATCH_SIZE"] = chosen["detect"]["batch_size"]
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "cpu_count": os.cpu_count(),
+            "validate_mode": main.validator.mode,
+            "detect_engine": main.detector.engine.name if main.detector.engine else None,
+            "analyze_images_per_second": combined,
+            "max_p99_ms": args.max_p99_ms,
+            "settings": settings,
+            "results": results
+        }, f, indent=2)
+    print(f"\nBest: {settings} (~{combined:.2f} analyzed images/s)")
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
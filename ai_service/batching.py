@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError
+
+from observability import tracing
+
+
+# =========================
+# Dynamic micro-batching
+# =========================
+class MicroBatcher:
+    """Queue concurrent requests and run them through one batched call.
+
+    A background thread takes the first pending item, then keeps collecting
+    until either ``max_batch_size`` items are queued or ``max_wait_ms`` has
+    passed since that first item arrived. ``process_batch`` receives the list
+    of items and must return one result per item, in order; a batch with a
+    different number of results fails as a whole.
+
+    Each traced caller gets a ``span_name`` span for the batch that served
+    it, so its trace shows queueing apart from the model call itself.
+    """
+
+    def __init__(self, process_batch, max_batch_size=8, max_wait_ms=5, name="batcher", span_name=None):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.span_name = span_name or f"{name}_batch"
+
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._items = 0
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so a child process starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name=f"{self.name}-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, item, timeout):
+        """Enqueue one item and block until its result is ready.
+
+        Raises concurrent.futures.TimeoutError after ``timeout`` seconds; an
+        item still waiting in the queue then is dropped from its batch.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, tracing.current_span()))
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Callers that timed out have cancelled their futures; the rest
+            # can no longer be cancelled once marked running
+            batch = [entry for entry in self._collect() if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _, _ in batch]
+            start = time.time()
+            began = time.perf_counter()
+            try:
+                results = list(self.process_batch(items))
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name}: process_batch returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+
+            duration_ms = (time.perf_counter() - began) * 1000
+            for _, _, span in batch:
+                tracing.record_span(span, self.span_name, start, duration_ms, batch_size=len(batch))
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._items += len(batch)
+
+    def stats(self):
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / batches, 2) if batches else 0.0,
+                "batch_size_histogram": {
+                    str(size): count for size, count in sorted(self._batch_sizes.items())
+                }
+            }
@@ -0,0 +1,274 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import time
+
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from inference_engine import DISEASE_CLASSES, PREPROCESS, EagerEngine, load_engine, quantize_int8
+
+
+# =========================
+# Model inference benchmark
+# =========================
+# Measures each stage on its own: model load time, images/sec and p50/p99
+# batch latency over a batch size x torch thread sweep, and peak RSS. Every
+# stage runs in a fresh process so its memory numbers are not mixed up with
+# the other model.
+#
+#   python benchmark_inference.py --batch-sizes 1,4,8 --threads 1,2,4 --json inference.json
+#
+# Fully offline: BLIP comes from the local snapshot directory and the Stage-2
+# weights from models/. When either is missing, a randomly initialised model
+# of the same architecture is timed instead (and marked so in the output).
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+class DocumentedCNN(nn.Module):
+    """The Stage-2 CNN from the README's Model Architecture section"""
+
+    def __init__(self, num_classes):
+        super().__init__()
+        self.features = nn.Sequential(
+            nn.Conv2d(3, 32, 3, padding=1), nn.ReLU(), nn.MaxPool2d(2),
+            nn.Conv2d(32, 64, 3, padding=1), nn.ReLU(), nn.MaxPool2d(2),
+            nn.Conv2d(64, 128, 3, padding=1), nn.ReLU(), nn.MaxPool2d(2)
+        )
+        self.classifier = nn.Sequential(
+            nn.Flatten(),
+            nn.Linear(128 * 28 * 28, 512), nn.ReLU(), nn.Dropout(0.5),
+            nn.Linear(512, 256), nn.ReLU(), nn.Dropout(0.3),
+            nn.Linear(256, num_classes)
+        )
+
+    def forward(self, x):
+        return self.classifier(self.features(x))
+
+
+def load_images(folder, count):
+    if folder:
+        paths = []
+        for root, _, names in os.walk(folder):
+            paths.extend(os.path.join(root, n) for n in names if n.lower().endswith(IMAGE_EXTENSIONS))
+        if paths:
+            return [Image.open(p).convert("RGB") for p in sorted(paths)[:count]]
+        print(f"No images under {folder}, using synthetic ones")
+    # Noise rather than flat colour so preprocessing does real work
+    return [Image.frombytes("RGB", (512, 512), os.urandom(512 * 512 * 3)) for _ in range(count)]
+
+
+def rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# -------------------------
+# Stage loaders
+# -------------------------
+def load_validate(args):
+    """Returns (run(images), weights) for BLIP captioning"""
+    from transformers import BlipConfig, BlipForConditionalGeneration, BlipImageProcessor, BlipProcessor
+
+    if os.path.isfile(os.path.join(args.blip_snapshot, "config.json")):
+        processor = BlipProcessor.from_pretrained(args.blip_snapshot, local_files_only=True)
+        model = BlipForConditionalGeneration.from_pretrained(args.blip_snapshot, local_files_only=True)
+        image_processor, tokenizer, weights = processor.image_processor, processor.tokenizer, "snapshot"
+    else:
+        model = BlipForConditionalGeneration(BlipConfig())
+        image_processor, tokenizer, weights = BlipImageProcessor(), None, "random"
+    model.eval()
+
+    options = {"max_length": args.caption_max_length}
+    if args.validate_mode == "fast":
+        model.text_decoder = quantize_int8(model.text_decoder)
+        options.update(max_length=args.fast_max_length, num_beams=1, do_sample=False)
+
+    def run(images):
+        pixel_values = image_processor(images=images, return_tensors="pt")["pixel_values"]
+        with torch.no_grad():
+            output = model.generate(pixel_values=pixel_values, **options)
+        # A random model has no vocabulary; its token IDs are not decoded
+        return tokenizer.batch_decode(output, skip_special_tokens=True) if tokenizer else output
+
+    return run, weights
+
+
+def load_detect(args):
+    """Returns (run(images), weights) for the Stage-2 classifier"""
+    if os.path.exists(args.detect_model):
+        model = torch.load(args.detect_model, map_location="cpu").eval()
+        engine = load_engine(model, args.detect_model, args.detect_engine, args.detect_quantize)
+        weights = "trained"
+    else:
+        engine = EagerEngine(DocumentedCNN(len(DISEASE_CLASSES)).eval(), args.detect_quantize)
+        weights = "random"
+
+    def run(images):
+        # The sweep sizes torch's pool; keep an ONNX session in step with it
+        if hasattr(engine, "set_num_threads"):
+            engine.set_num_threads(torch.get_num_threads())
+        batch = torch.stack([PREPROCESS(image) for image in images])
+        with torch.no_grad():
+            return torch.softmax(engine(batch), dim=1).argmax(dim=1)
+
+    return run, weights
+
+
+LOADERS = {"validate": load_validate, "detect": load_detect}
+
+
+def bench_stage(stage, args, results):
+    """Child process: load one model and sweep threads x batch sizes"""
+    try:
+        results.put(_sweep_stage(stage, args))
+    except Exception as e:
+        # Reported as a string so the parent fails this stage at once
+        results.put(f"{type(e).__name__}: {e}")
+        raise
+
+
+def _sweep_stage(stage, args):
+    images = load_images(args.images, max(args.batch_sizes))
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    run, weights = LOADERS[stage](args)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    sweep = []
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for batch_size in args.batch_sizes:
+            batch = [images[i % len(images)] for i in range(batch_size)]
+            for _ in range(args.warmup):
+                run(batch)
+            latencies = []
+            for _ in range(args.iterations):
+                began = time.perf_counter()
+                run(batch)
+                latencies.append((time.perf_counter() - began) * 1000)
+            sweep.append({
+                "threads": threads,
+                "batch_size": batch_size,
+                "images_per_second": batch_size * len(latencies) / (sum(latencies) / 1000),
+                "p50_ms": percentile(latencies, 50),
+                "p99_ms": percentile(latencies, 99)
+            })
+            print(
+                f"{stage:<9}{threads:>8}{batch_size:>7}{sweep[-1]['images_per_second']:>10.2f}"
+                f"{sweep[-1]['p50_ms']:>10.1f}{sweep[-1]['p99_ms']:>10.1f}", flush=True
+            )
+
+    return {
+        "stage": stage,
+        "weights": weights,
+        "load_seconds": load_seconds,
+        "rss_before_load_mb": rss_before,
+        "rss_after_load_mb": rss_loaded,
+        "peak_rss_mb": rss_mb(),
+        "sweep": sweep
+    }
+
+
+def run_stage(context, stage, args):
+    """Benchmark one stage in a fresh process.
+
+    A child that raises, crashes or does not finish within ``args.timeout``
+    seconds fails the stage: the result gets a ``failed`` reason instead of
+    timings and the child is terminated.
+    """
+    results = context.Queue()
+    process = context.Process(target=bench_stage, args=(stage, args, results))
+    process.start()
+
+    result = None
+    error = None
+    deadline = time.monotonic() + args.timeout
+    while result is None and error is None:
+        try:
+            outcome = results.get(timeout=1.0)
+        except queue.Empty:
+            if process.exitcode not in (None, 0):
+                error = f"benchmark process exited with code {process.exitcode}"
+            elif process.exitcode == 0:
+                error = "benchmark process exited without a result"
+            elif time.monotonic() > deadline:
+                error = f"no result within {args.timeout:g}s"
+            continue
+        if isinstance(outcome, str):
+            error = outcome
+        else:
+            result = outcome
+
+    if error is not None and process.is_alive():
+        process.terminate()
+    process.join()
+    if error is not None:
+        return {"stage": stage, "failed": error}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Stage-1 and Stage-2 inference")
+    parser.add_argument("--stages", default="validate,detect")
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--threads", default=str(os.cpu_count() or 1))
+    parser.add_argument("--iterations", type=int, default=10, help="Timed batches per setting")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed batches per setting")
+    parser.add_argument("--images", help="Sample image folder; synthetic images otherwise")
+    parser.add_argument("--blip-snapshot", default=os.environ.get("BLIP_SNAPSHOT_DIR", "models/blip-image-captioning-base"))
+    parser.add_argument("--validate-mode", choices=("accurate", "fast"), default=os.environ.get("VALIDATE_MODE", "accurate"))
+    parser.add_argument("--caption-max-length", type=int, default=40)
+    parser.add_argument("--fast-max-length", type=int, default=int(os.environ.get("VALIDATE_FAST_MAX_LENGTH", "20")))
+    parser.add_argument("--detect-model", default="models/stage2_disease_model.pth")
+    parser.add_argument("--detect-engine", default=os.environ.get("DETECT_ENGINE", "eager"))
+    parser.add_argument("--detect-quantize", default=os.environ.get("DETECT_QUANTIZE", "none"))
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds allowed per stage before it fails")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+    args.batch_sizes = [int(v) for v in args.batch_sizes.split(",")]
+    args.threads = [int(v) for v in args.threads.split(",")]
+
+    # A fresh interpreter per stage keeps peak RSS and load time honest
+    context = multiprocessing.get_context("spawn")
+    results = []
+    print(f"{'stage':<9}{'threads':>8}{'batch':>7}{'img/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for stage in args.stages.split(","):
+        results.append(run_stage(context, stage, args))
+
+    print(f"\n{'stage':<9}{'weights':>9}{'load s':>9}{'rss MB':>9}{'peak MB':>9}")
+    for result in results:
+        if "failed" in result:
+            print(f"{result['stage']:<9}  FAILED: {result['failed']}")
+            continue
+        print(
+            f"{result['stage']:<9}{result['weights']:>9}{result['load_seconds']:>9.2f}"
+            f"{result['rss_after_load_mb']:>9.0f}{result['peak_rss_mb']:>9.0f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "cpu_count": os.cpu_count(),
+                "torch": torch.__version__,
+                "config": {k: v for k, v in vars(args).items() if k != "json"},
+                "stages": results
+            }, f, indent=2)
+    return 1 if any("failed" in result for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
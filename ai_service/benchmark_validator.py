@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from PIL import Image
+
+from main import MedicalImageValidator
+
+
+# =========================
+# Stage-1 validator mode benchmark
+# =========================
+# Runs the accurate and fast validator modes over the same images and reports
+# how often the accept/reject decision agrees, plus per-call latency.
+#
+#   python benchmark_validator.py --images data/validation_samples
+#
+# Any folder of images works (sub-folders are scanned too); mix medical and
+# non-medical images to exercise both sides of the keyword check.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_images(folder):
+    paths = []
+    for root, _, names in os.walk(folder):
+        paths.extend(
+            os.path.join(root, name) for name in sorted(names)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    return [(path, Image.open(path).convert("RGB")) for path in sorted(paths)]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_mode(mode, images, batch_size, warmup):
+    validator = MedicalImageValidator(mode=mode)
+    start = time.perf_counter()
+    validator.load_blip()
+    load_seconds = time.perf_counter() - start
+
+    for _, image in images[:warmup]:
+        validator.generate_captions([image])
+
+    decisions, captions, latencies = [], [], []
+    for i in range(0, len(images), batch_size):
+        chunk = [image for _, image in images[i:i + batch_size]]
+        start = time.perf_counter()
+        batch_captions = validator.generate_captions(chunk)
+        latencies.append((time.perf_counter() - start) * 1000)
+        for caption in batch_captions:
+            captions.append(caption)
+            decisions.append(validator.check_caption(caption)[0])
+
+    return {
+        "mode": mode,
+        "load_seconds": load_seconds,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "images_per_second": len(images) / (sum(latencies) / 1000),
+        "accepted": sum(decisions),
+        "decisions": decisions,
+        "captions": captions
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the accurate and fast Stage-1 validator modes")
+    parser.add_argument("--images", required=True)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=2, help="Images captioned before timing")
+    parser.add_argument("--json", help="Also write per-image results to this file")
+    args = parser.parse_args(argv)
+
+    images = load_images(args.images)
+    if not images:
+        print(f"No images found under {args.images}")
+        return 1
+    print(f"Loaded {len(images)} images from {args.images}")
+
+    accurate = run_mode("accurate", images, args.batch_size, args.warmup)
+    fast = run_mode("fast", images, args.batch_size, args.warmup)
+
+    disagreements = [
+        {"image": path, "accurate": a_caption, "fast": f_caption}
+        for (path, _), a, f, a_caption, f_caption in zip(
+            images, accurate["decisions"], fast["decisions"], accurate["captions"], fast["captions"]
+        )
+        if a != f
+    ]
+    agreement = 1 - len(disagreements) / len(images)
+
+    print(f"\n{'mode':<10}{'load s':>9}{'p50 ms':>10}{'p99 ms':>10}{'img/s':>9}{'accepted':>10}")
+    for row in (accurate, fast):
+        print(
+            f"{row['mode']:<10}{row['load_seconds']:>9.1f}{row['p50_ms']:>10.1f}"
+            f"{row['p99_ms']:>10.1f}{row['images_per_second']:>9.2f}{row['accepted']:>10}"
+        )
+    print(f"\nDecision agreement: {agreement:.3f} ({len(disagreements)} of {len(images)} differ)")
+    for item in disagreements:
+        print(f"  {item['image']}\n    accurate: {item['accurate']}\n    fast:     {item['fast']}")
+
+    if args.json:
+        summary = {
+            "batch_size": args.batch_size,
+            "images": len(images),
+            "agreement": agreement,
+            "modes": [
+                {k: v for k, v in row.items() if k not in ("decisions", "captions")}
+                for row in (accurate, fast)
+            ],
+            "disagreements": disagreements
+        }
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+from PIL import Image
+
+from inference_engine import DISEASE_CLASSES, PREPROCESS, load_engine
+
+
+# =========================
+# Stage-2 engine comparison
+# =========================
+# Scores every engine/quantization combination on a held-out folder laid out
+# like torchvision's ImageFolder (one sub-folder per disease class) and
+# reports accuracy, agreement with the eager fp32 model and latency.
+#
+#   python compare_engines.py --images data/holdout
+#
+# Artifacts are compiled next to the model exactly as the service would.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+COMBINATIONS = [
+    ("eager", "none"), ("eager", "int8"),
+    ("torchscript", "none"), ("torchscript", "int8"),
+    ("onnx", "none"), ("onnx", "int8")
+]
+
+
+def load_images(folder):
+    samples = []
+    for label in sorted(os.listdir(folder)):
+        class_dir = os.path.join(folder, label)
+        if not os.path.isdir(class_dir):
+            continue
+        if label not in DISEASE_CLASSES:
+            print(f"Skipping unknown class folder {label!r}")
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                image = Image.open(os.path.join(class_dir, name)).convert("RGB")
+                samples.append((PREPROCESS(image), DISEASE_CLASSES.index(label)))
+    return samples
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def evaluate(engine, samples, batch_size, warmup):
+    tensors = [tensor for tensor, _ in samples]
+    batches = [torch.stack(tensors[i:i + batch_size]) for i in range(0, len(tensors), batch_size)]
+
+    with torch.no_grad():
+        for batch in batches[:warmup]:
+            engine(batch)
+
+        predictions, latencies = [], []
+        for batch in batches:
+            start = time.perf_counter()
+            output = engine(batch)
+            latencies.append((time.perf_counter() - start) * 1000)
+            predictions.extend(output.argmax(dim=1).tolist())
+    return predictions, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare Stage-2 inference engines")
+    parser.add_argument("--images", required=True, help="Held-out folder with one sub-folder per class")
+    parser.add_argument("--model", default="models/stage2_disease_model.pth")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=3, help="Batches run before timing")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    samples = load_images(args.images)
+    if not samples:
+        print(f"No labelled images found under {args.images}")
+        return 1
+    labels = [label for _, label in samples]
+    print(f"Loaded {len(samples)} images from {args.images}")
+
+    results = []
+    reference = None
+    for engine_name, quantize in COMBINATIONS:
+        model = torch.load(args.model, map_location="cpu").eval()
+        engine = load_engine(model, args.model, engine_name, quantize)
+        if engine.name != (engine_name if quantize == "none" else f"{engine_name}-{quantize}"):
+            # load_engine fell back to another engine; already measured
+            continue
+
+        predictions, latencies = evaluate(engine, samples, args.batch_size, args.warmup)
+        if reference is None:
+            reference = predictions
+        results.append({
+            "engine": engine.name,
+            "accuracy": sum(p == l for p, l in zip(predictions, labels)) / len(labels),
+            "agreement": sum(p == r for p, r in zip(predictions, reference)) / len(reference),
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+            "images_per_second": len(samples) / (sum(latencies) / 1000)
+        })
+
+    print(f"\n{'engine':<18}{'accuracy':>10}{'agreement':>11}{'p50 ms':>10}{'p99 ms':>10}{'img/s':>10}")
+    for row in results:
+        print(
+            f"{row['engine']:<18}{row['accuracy']:>10.3f}{row['agreement']:>11.3f}"
+            f"{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['images_per_second']:>10.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"batch_size": args.batch_size, "images": len(samples), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import gc
+import glob
+import os
+
+from tuning import setting
+
+
+# =========================
+# Pre-fork production server
+# =========================
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# The master imports main.py (preload_app), loads and warms up BLIP and the
+# Stage-2 model, then forks the workers. Weights are never written after
+# loading, so every worker shares the master's copy of them copy-on-write
+# instead of loading its own.
+#
+# Each worker serves AI_WORKER_THREADS requests concurrently (they meet in
+# the micro-batchers) and runs torch with TORCH_NUM_THREADS intra-op threads.
+# By default the cores are split evenly between workers so that
+# AI_WORKERS x TORCH_NUM_THREADS does not oversubscribe the node, unless
+# autotune.py measured a better split (see tuning.py).
+
+workers = int(setting("AI_WORKERS", "2"))
+threads = int(os.environ.get("AI_WORKER_THREADS", "4"))
+torch_threads = int(setting("TORCH_NUM_THREADS", "0")) or max(1, (os.cpu_count() or 1) // workers)
+
+bind = f"0.0.0.0:{os.environ.get('AI_SERVICE_PORT', '5001')}"
+preload_app = True
+# Captioning a large batch on a busy node can take a while
+timeout = int(os.environ.get("AI_WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+
+# prometheus_client keeps each worker's metric values in files in this
+# directory and /metrics sums them. It has to be set before main.py (and so
+# prometheus_client) is imported, and emptied so totals from a previous run
+# of the server are not added in.
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/ai_service_metrics")
+os.makedirs(metrics_dir, exist_ok=True)
+for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+    os.remove(path)
+
+
+def when_ready(server):
+    # Runs in the master after main.py was imported and before any fork
+    import main
+    main.set_torch_threads(torch_threads, interop_threads=1)
+    main.warm_up()
+    # Objects created so far are never freed; keep the collector from
+    # touching them, which would copy their pages into every worker
+    gc.freeze()
+    server.log.info(f"Models ready, forking {workers} workers x {torch_threads} torch threads")
+
+
+def post_fork(server, worker):
+    import main
+    main.set_torch_threads(torch_threads)
+
+
+def child_exit(server, worker):
+    # A dead worker's in-flight gauge must not count any more
+    import observability.metrics
+    observability.metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,219 @@
+import argparse
+import inspect
+import logging
+import os
+import sys
+import threading
+
+import torch
+import torch.nn as nn
+import torchvision.transforms as transforms
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+# =========================
+# Stage-2 inference engines
+# =========================
+# The trained model is a pickled eager nn.Module. For CPU serving it can be
+# compiled once to TorchScript or ONNX (run by ONNX Runtime when installed),
+# optionally with dynamic int8 quantization. Compiled artifacts are written
+# next to the .pth file and rebuilt whenever the .pth is newer.
+
+log = logging.getLogger("stage2")
+
+ENGINES = ("eager", "torchscript", "onnx", "auto")
+QUANTIZE_MODES = ("none", "int8")
+INPUT_SHAPE = (3, 224, 224)
+
+# Shared with the comparison script so it scores exactly what /detect serves
+DISEASE_CLASSES = [
+    'dermatitis', 'eczema', 'psoriasis', 'acne',
+    'rosacea', 'vitiligo', 'melanoma',
+    'scurvy', 'pellagra', 'beriberi', 'rickets'
+]
+
+PREPROCESS = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(
+        mean=[0.485, 0.456, 0.406],
+        std=[0.229, 0.224, 0.225]
+    )
+])
+
+
+class EagerEngine:
+    def __init__(self, model, quantize="none"):
+        if quantize == "int8":
+            model = quantize_int8(model)
+        self.model = model.eval()
+        self.name = "eager" + ("-int8" if quantize == "int8" else "")
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(batch)
+
+
+class TorchScriptEngine:
+    def __init__(self, path):
+        self.model = torch.jit.load(path, map_location="cpu").eval()
+        # Freezing inlines weights and folds constants for faster CPU runs
+        self.model = torch.jit.optimize_for_inference(torch.jit.freeze(self.model))
+        self.name = "torchscript" + ("-int8" if path.endswith(".int8.ts") else "")
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(batch)
+
+
+class OnnxEngine:
+    """ONNX Runtime session, built separately in every process that runs it.
+
+    A session's thread pool does not survive fork(), so a gunicorn worker
+    builds its own on first use instead of inheriting the master's. The
+    intra-op thread count is passed in (0 lets ONNX Runtime use every core)
+    and can be changed with set_num_threads before the next call.
+    """
+
+    def __init__(self, path, num_threads=0):
+        self.path = path
+        self.num_threads = num_threads
+        self.input_name = None
+        self.name = "onnx" + ("-int8" if path.endswith(".int8.onnx") else "")
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def set_num_threads(self, num_threads):
+        with self._lock:
+            if num_threads != self.num_threads:
+                self.num_threads = num_threads
+                self._session = None
+
+    def session(self):
+        if self._session is not None and self._pid == os.getpid():
+            return self._session
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = self.num_threads
+                options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+                session = onnxruntime.InferenceSession(
+                    self.path, options, providers=["CPUExecutionProvider"]
+                )
+                self.input_name = session.get_inputs()[0].name
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def __call__(self, batch):
+        session = self.session()
+        output = session.run(None, {self.input_name: batch.numpy()})[0]
+        return torch.from_numpy(output)
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization; applies to the Linear layers of the model"""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def artifact_path(model_path, engine, quantize):
+    base = os.path.splitext(model_path)[0]
+    suffix = ".int8" if quantize == "int8" else ""
+    return base + suffix + (".ts" if engine == "torchscript" else ".onnx")
+
+
+def _is_stale(artifact, model_path):
+    return not os.path.exists(artifact) or os.path.getmtime(artifact) < os.path.getmtime(model_path)
+
+
+def export_torchscript(model, path, quantize="none"):
+    if quantize == "int8":
+        model = quantize_int8(model)
+    example = torch.randn(1, *INPUT_SHAPE)
+    with torch.no_grad():
+        traced = torch.jit.trace(model.eval(), example)
+    traced.save(path)
+    return path
+
+
+def export_onnx(model, path, quantize="none"):
+    example = torch.randn(1, *INPUT_SHAPE)
+    fp32_path = path.replace(".int8.onnx", ".onnx")
+    kwargs = {}
+    # Newer torch defaults to the dynamo exporter, which needs extra packages
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    torch.onnx.export(
+        model.eval(), example, fp32_path,
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17, **kwargs
+    )
+    if quantize == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+    return path
+
+
+def load_engine(model, model_path, engine="eager", quantize="none", num_threads=0):
+    """Build the configured engine for an eager model loaded from model_path.
+
+    num_threads sizes ONNX Runtime's intra-op pool; torch engines follow
+    torch.set_num_threads instead.
+
+    If compilation fails the next engine down (onnx -> torchscript -> eager)
+    is used with a log line, so a bad export never takes Stage 2 down.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}; expected one of {ENGINES}")
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown quantize mode {quantize!r}; expected one of {QUANTIZE_MODES}")
+
+    if engine == "auto":
+        engine = "onnx" if onnxruntime is not None else "torchscript"
+    if engine == "onnx" and onnxruntime is None:
+        log.warning("onnxruntime not installed, using TorchScript")
+        engine = "torchscript"
+
+    candidates = {"onnx": ["onnx", "torchscript"], "torchscript": ["torchscript"], "eager": []}[engine]
+    for candidate in candidates:
+        path = artifact_path(model_path, candidate, quantize)
+        try:
+            if _is_stale(path, model_path):
+                log.info("Compiling %s engine -> %s", candidate, path)
+                exporter = export_torchscript if candidate == "torchscript" else export_onnx
+                exporter(model, path, quantize)
+            if candidate == "torchscript":
+                return TorchScriptEngine(path)
+            onnx_engine = OnnxEngine(path, num_threads)
+            # Build the session now so a broken artifact falls back here
+            # rather than failing the first request
+            onnx_engine.session()
+            return onnx_engine
+        except Exception as e:
+            log.warning("%s engine unavailable (%s)", candidate, e)
+    return EagerEngine(model, quantize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the Stage-2 model for CPU serving")
+    parser.add_argument("--model", default="models/stage2_disease_model.pth")
+    parser.add_argument("--engine", choices=("torchscript", "onnx"), default="torchscript")
+    parser.add_argument("--quantize", choices=QUANTIZE_MODES, default="none")
+    args = parser.parse_args(argv)
+
+    model = torch.load(args.model, map_location="cpu")
+    path = artifact_path(args.model, args.engine, args.quantize)
+    exporter = export_torchscript if args.engine == "torchscript" else export_onnx
+    exporter(model, path, args.quantize)
+    print(f"Wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
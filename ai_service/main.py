@@ -1,26 +1,133 @@
-from flask import Flask, request, jsonify
+import time
+
+# Taken before the heavy imports so the startup log covers them too
+STARTUP_BEGAN = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
+from transformers import BlipProcessor, BlipForConditionalGeneration, StoppingCriteria, StoppingCriteriaList
 import torch
-import torchvision.transforms as transforms
 import re
 import os
+import io
 import random
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+from batching import MicroBatcher
+import metrics
+from metrics import INFERENCE_BATCH_SIZE, INFERENCE_SECONDS, INFERENCE_TOTAL, STAGE_SECONDS
+from inference_engine import DISEASE_CLASSES, PREPROCESS, load_engine, quantize_int8
+from result_cache import ResultCache
+from tuning import setting
+import observability.metrics
+from observability import logs, tracing
+
+logs.configure("ai_service")
+stage1_log = logging.getLogger("stage1")
+stage2_log = logging.getLogger("stage2")
+startup_log = logging.getLogger("startup")
 
 app = Flask(__name__)
 CORS(app)
+observability.metrics.instrument(app, metrics.REQUEST_SECONDS, metrics.REQUESTS_IN_FLIGHT)
+tracing.instrument(app)
 
 DEVICE = torch.device("cpu")
 
+BLIP_MODEL_NAME = "Salesforce/blip-image-captioning-base"
+CAPTION_MAX_LENGTH = 40
+
+# BLIP is loaded from this directory without any hub lookup; when it is
+# missing the weights are downloaded once and saved here
+BLIP_SNAPSHOT_DIR = os.environ.get("BLIP_SNAPSHOT_DIR", "models/blip-image-captioning-base")
+
+# Load both models and run warm-up inferences before accepting traffic
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "true").lower() in ("1", "true", "yes")
+WARMUP_ITERATIONS = int(os.environ.get("WARMUP_ITERATIONS", "2"))
+
+# Intra-op threads for this process (0 = torch default). Under gunicorn every
+# worker gets its own pool; see gunicorn.conf.py. This and the batch sizes
+# below can also come from the autotune.py output (see tuning.py)
+TORCH_NUM_THREADS = int(setting("TORCH_NUM_THREADS", "0"))
+
+# Stage-1 validator mode: "accurate" runs fp32 BLIP as trained, "fast" runs an
+# int8 text decoder with short greedy captions that stop once a rejection
+# keyword has been generated
+VALIDATE_MODES = ("accurate", "fast")
+VALIDATE_MODE = os.environ.get("VALIDATE_MODE", "accurate")
+VALIDATE_FAST_MAX_LENGTH = int(os.environ.get("VALIDATE_FAST_MAX_LENGTH", "20"))
+
+# Stage-2 CPU engine: eager | torchscript | onnx | auto, optionally int8-quantized
+DETECT_ENGINE = os.environ.get("DETECT_ENGINE", "eager")
+DETECT_QUANTIZE = os.environ.get("DETECT_QUANTIZE", "none")
+
+# Stage-2 micro-batching: flush when the batch is full or the wait budget runs out
+DETECT_MAX_BATCH_SIZE = int(setting("DETECT_MAX_BATCH_SIZE", "8"))
+DETECT_MAX_WAIT_MS = float(os.environ.get("DETECT_MAX_WAIT_MS", "5"))
+# Longest a request waits for its batched result before giving up
+DETECT_RESULT_TIMEOUT = float(os.environ.get("DETECT_RESULT_TIMEOUT", "30"))
+
+# Stage-1 caption batching; captioning is slow so a longer wait still pays off
+VALIDATE_MAX_BATCH_SIZE = int(setting("VALIDATE_MAX_BATCH_SIZE", "8"))
+VALIDATE_MAX_WAIT_MS = float(os.environ.get("VALIDATE_MAX_WAIT_MS", "20"))
+VALIDATE_RESULT_TIMEOUT = float(os.environ.get("VALIDATE_RESULT_TIMEOUT", "60"))
+
+# Result cache keyed by image SHA-256 + model version; empty path = memory only
+INFERENCE_CACHE_SIZE = int(os.environ.get("INFERENCE_CACHE_SIZE", "1024"))
+INFERENCE_CACHE_TTL = float(os.environ.get("INFERENCE_CACHE_TTL", "86400"))
+INFERENCE_CACHE_PATH = os.environ.get("INFERENCE_CACHE_PATH", "models/inference_cache.db")
+
+# Span timings as JSON lines (empty = keep request IDs, write nothing)
+TRACE_PATH = os.environ.get("TRACE_PATH", "models/traces/ai_service.jsonl")
+tracing.configure("ai_service", TRACE_PATH)
+
+
+@contextmanager
+def stage_timer(name):
+    """Time one pipeline stage as a metric and as a span of the request's trace"""
+    with STAGE_SECONDS.labels(name).time(), tracing.span(name):
+        yield
+
 
 # =========================
 # Stage 1: Medical Image Validation
 # =========================
+class ValidatorError(Exception):
+    """BLIP is missing or failed to load or run, so the image was not judged"""
+
+
+class RejectionKeywordStop(StoppingCriteria):
+    """Stop generating once every caption in the batch contains a rejection keyword.
+
+    The blacklist wins over the whitelist in check_caption, so the rest of
+    such a caption cannot change the decision. The last word is ignored
+    because it may still be the start of a longer word.
+    """
+
+    def __init__(self, validator):
+        self.validator = validator
+
+    def __call__(self, input_ids, scores, **kwargs):
+        captions = self.validator.processor.batch_decode(input_ids, skip_special_tokens=True)
+        for caption in captions:
+            words = self.validator.clean_text(caption).split()[:-1]
+            if not self.validator.rejection_keywords.intersection(words):
+                return False
+        return True
+
+
 class MedicalImageValidator:
-    def __init__(self):
+    def __init__(self, mode=VALIDATE_MODE):
+        if mode not in VALIDATE_MODES:
+            raise ValueError(f"Unknown validator mode {mode!r}; expected one of {VALIDATE_MODES}")
+        self.mode = mode
         self.processor = None
         self.model = None
+        self._load_lock = threading.Lock()
 
         # Biological whitelist
         self.biological_keywords = {
@@ -43,18 +150,42 @@ class MedicalImageValidator:
             'bird', 'fish', 'insect', 'clothing'
         }
 
+        self.batcher = MicroBatcher(
+            self.generate_captions,
+            max_batch_size=VALIDATE_MAX_BATCH_SIZE,
+            max_wait_ms=VALIDATE_MAX_WAIT_MS,
+            name="stage1",
+            span_name="caption_generate"
+        )
+
     def load_blip(self):
-        """Lazy-load BLIP model only when needed"""
-        if self.processor is None or self.model is None:
-            print("[STAGE-1] Loading BLIP model...")
-            self.processor = BlipProcessor.from_pretrained(
-                "Salesforce/blip-image-captioning-base"
-            )
-            self.model = BlipForConditionalGeneration.from_pretrained(
-                "Salesforce/blip-image-captioning-base"
-            ).to(DEVICE)
+        """Load BLIP on first use (or at startup when PRELOAD_MODELS is set)"""
+        with self._load_lock:
+            if self.processor is not None and self.model is not None:
+                return
+            local = os.path.isfile(os.path.join(BLIP_SNAPSHOT_DIR, "config.json"))
+            source = BLIP_SNAPSHOT_DIR if local else BLIP_MODEL_NAME
+            stage1_log.info("Loading BLIP model from %s...", source)
+            processor = BlipProcessor.from_pretrained(source, local_files_only=local)
+            model = BlipForConditionalGeneration.from_pretrained(source, local_files_only=local)
+            if not local and BLIP_SNAPSHOT_DIR:
+                processor.save_pretrained(BLIP_SNAPSHOT_DIR)
+                model.save_pretrained(BLIP_SNAPSHOT_DIR)
+                stage1_log.info("Saved BLIP snapshot to %s", BLIP_SNAPSHOT_DIR)
+            self.model = model.to(DEVICE)
             self.model.eval()
-            print("[STAGE-1] BLIP model loaded successfully")
+            if self.mode == "fast":
+                # The vision encoder runs once per image; the decoder runs per token
+                self.model.text_decoder = quantize_int8(self.model.text_decoder)
+            self.processor = processor
+            stage1_log.info("BLIP model loaded successfully (%s mode)", self.mode)
+
+    @property
+    def model_version(self):
+        """Identifies the caption settings for result caching"""
+        if self.mode == "fast":
+            return f"validate:{BLIP_MODEL_NAME}:fast-int8:max_length={VALIDATE_FAST_MAX_LENGTH}"
+        return f"validate:{BLIP_MODEL_NAME}:max_length={CAPTION_MAX_LENGTH}"
 
     def clean_text(self, text):
         text = text.lower()
@@ -62,33 +193,95 @@ class MedicalImageValidator:
         return text
 
     def generate_caption(self, image):
+        return self.generate_captions([image])[0]
+
+    def generate_captions(self, images):
+        """Caption a list of images with one padded generate call"""
         self.load_blip()
-        inputs = self.processor(image, return_tensors="pt").to(DEVICE)
-        with torch.no_grad():
-            output = self.model.generate(**inputs, max_length=40)
-        return self.processor.decode(output[0], skip_special_tokens=True)
+        inputs = self.processor(images=images, return_tensors="pt", padding=True).to(DEVICE)
+        if self.mode == "fast":
+            options = {
+                "max_length": VALIDATE_FAST_MAX_LENGTH,
+                "num_beams": 1,
+                "do_sample": False,
+                "stopping_criteria": StoppingCriteriaList([RejectionKeywordStop(self)])
+            }
+        else:
+            options = {"max_length": CAPTION_MAX_LENGTH}
+        with INFERENCE_SECONDS.labels("stage1").time(), torch.no_grad():
+            output = self.model.generate(**inputs, **options)
+        INFERENCE_BATCH_SIZE.labels("stage1").observe(len(images))
+        INFERENCE_TOTAL.labels("stage1", "model").inc(len(images))
+        return self.processor.batch_decode(output, skip_special_tokens=True)
+
+    def check_caption(self, caption):
+        """Apply the blacklist then the whitelist to a generated caption"""
+        words = set(self.clean_text(caption).split())
+
+        # Blacklist check
+        rejected = words.intersection(self.rejection_keywords)
+        if rejected:
+            return False, caption, f"Non-medical content detected: {', '.join(rejected)}"
+
+        # Whitelist check
+        accepted = words.intersection(self.biological_keywords)
+        if accepted:
+            return True, caption, f"Biological content verified: {', '.join(accepted)}"
+
+        return False, caption, "No biological content detected"
+
+    def validate_rgb(self, image):
+        """Validate an already decoded RGB image.
+
+        Raises ValidatorError when no caption could be generated; that is a
+        service failure, not a verdict on the image.
+        """
+        try:
+            with stage_timer("stage1"):
+                caption = self.batcher.submit(image, VALIDATE_RESULT_TIMEOUT)
+        except Exception as e:
+            stage1_log.error("Captioning failed: %s", e)
+            raise ValidatorError(f"Stage 1 validator unavailable: {e}") from e
+        valid, caption, reason = self.check_caption(caption)
+        stage1_log.debug("Caption %r: %s", caption, reason, extra=logs.SAMPLED)
+        return valid, caption, reason
 
     def validate_image(self, image_file):
         try:
-            image = Image.open(image_file).convert("RGB")
-            caption = self.generate_caption(image)
-
-            words = set(self.clean_text(caption).split())
-
-            # Blacklist check
-            rejected = words.intersection(self.rejection_keywords)
-            if rejected:
-                return False, caption, f"Non-medical content detected: {', '.join(rejected)}"
-
-            # Whitelist check
-            accepted = words.intersection(self.biological_keywords)
-            if accepted:
-                return True, caption, f"Biological content verified: {', '.join(accepted)}"
-
-            return False, caption, "No biological content detected"
-
+            with stage_timer("decode"):
+                image = Image.open(image_file).convert("RGB")
         except Exception as e:
             return False, None, str(e)
+        return self.validate_rgb(image)
+
+    def validate_images(self, image_files):
+        """Validate many images, captioning them in batches of VALIDATE_MAX_BATCH_SIZE.
+
+        Images that cannot be decoded are rejected individually; a captioning
+        failure raises ValidatorError for the whole call.
+        """
+        results = [None] * len(image_files)
+        images = []
+        positions = []
+        for i, image_file in enumerate(image_files):
+            try:
+                images.append(Image.open(image_file).convert("RGB"))
+                positions.append(i)
+            except Exception as e:
+                results[i] = (False, None, str(e))
+
+        size = VALIDATE_MAX_BATCH_SIZE
+        for start in range(0, len(images), size):
+            chunk = positions[start:start + size]
+            try:
+                captions = self.generate_captions(images[start:start + size])
+            except Exception as e:
+                stage1_log.error("Captioning failed: %s", e)
+                raise ValidatorError(f"Stage 1 validator unavailable: {e}") from e
+            for i, caption in zip(chunk, captions):
+                results[i] = self.check_caption(caption)
+
+        return results
 
 
 # =========================
@@ -97,64 +290,221 @@ class MedicalImageValidator:
 class DiseaseDetector:
     def __init__(self):
         self.model = None
-        self.disease_classes = [
-            'dermatitis', 'eczema', 'psoriasis', 'acne',
-            'rosacea', 'vitiligo', 'melanoma',
-            'scurvy', 'pellagra', 'beriberi', 'rickets'
-        ]
-
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225]
-            )
-        ])
+        self.engine = None
+        self.model_version = None
+        self.disease_classes = list(DISEASE_CLASSES)
+        self.transform = PREPROCESS
+
+        self.batcher = MicroBatcher(
+            self.predict_batch,
+            max_batch_size=DETECT_MAX_BATCH_SIZE,
+            max_wait_ms=DETECT_MAX_WAIT_MS,
+            name="stage2",
+            span_name="cnn_forward"
+        )
 
         self.load_model()
 
     def load_model(self):
         model_path = "models/stage2_disease_model.pth"
         if os.path.exists(model_path):
-            print("[STAGE-2] Loading trained disease model...")
+            stage2_log.info("Loading trained disease model...")
             self.model = torch.load(model_path, map_location=DEVICE)
             self.model.eval()
+            self.engine = load_engine(
+                self.model, model_path, DETECT_ENGINE, DETECT_QUANTIZE, num_threads=TORCH_NUM_THREADS
+            )
+            stage2_log.info("Inference engine: %s", self.engine.name)
+            with open(model_path, "rb") as f:
+                weights_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+            # Compiled/quantized engines can shift scores slightly, so they
+            # get their own cache entries
+            self.model_version = f"detect:{weights_hash}:{self.engine.name}"
         else:
-            print("[STAGE-2] No trained model found, using fallback logic")
+            stage2_log.warning("No trained model found, using fallback logic")
+
+    def predict_batch(self, tensors):
+        """Run one forward pass over a list of transformed image tensors"""
+        batch = torch.stack(tensors).to(DEVICE)
+        with INFERENCE_SECONDS.labels("stage2").time(), torch.no_grad():
+            output = self.engine(batch)
+            probs = torch.softmax(output, dim=1)
+            confidences, idxs = torch.max(probs, 1)
+        INFERENCE_BATCH_SIZE.labels("stage2").observe(len(tensors))
+        INFERENCE_TOTAL.labels("stage2", "model").inc(len(tensors))
+        return [
+            (self.disease_classes[idx], confidence)
+            for idx, confidence in zip(idxs.tolist(), confidences.tolist())
+        ]
 
     def detect_disease(self, image_file):
-        image = Image.open(image_file).convert("RGB")
+        with stage_timer("decode"):
+            image = Image.open(image_file).convert("RGB")
+        return self.detect_rgb(image)
 
+    def detect_rgb(self, image):
+        """Classify an already decoded RGB image"""
         if self.model:
-            input_tensor = self.transform(image).unsqueeze(0)
-            with torch.no_grad():
-                output = self.model(input_tensor)
-                probs = torch.softmax(output, dim=1)[0]
-                confidence, idx = torch.max(probs, 0)
-            return self.disease_classes[idx.item()], confidence.item()
+            with stage_timer("stage2"):
+                return self.batcher.submit(self.transform(image), DETECT_RESULT_TIMEOUT)
 
         # Fallback (educational)
+        INFERENCE_TOTAL.labels("stage2", "fallback").inc()
         return random.choice(self.disease_classes), round(random.uniform(0.65, 0.9), 2)
 
 
+# =========================
+# Startup and warm-up
+# =========================
+startup_state = {"ready": False, "preloaded": PRELOAD_MODELS, "phases": {}, "error": None}
+
+
+def set_torch_threads(num_threads, interop_threads=None):
+    """Size torch's (and the ONNX engine's) CPU thread pools for this process"""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+        if hasattr(detector.engine, "set_num_threads"):
+            detector.engine.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only settable once, before any inter-op work has run
+            pass
+    startup_log.info(
+        "pid %d: %d intra-op / %d inter-op threads",
+        os.getpid(), torch.get_num_threads(), torch.get_num_interop_threads()
+    )
+
+
+@contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    startup_state["phases"][name] = round(elapsed, 3)
+    startup_log.info("%s: %.2fs", name, elapsed)
+
+
+def warm_up():
+    """Load both models and push synthetic images through them.
+
+    The first forward passes allocate buffers and pick kernels, so running
+    them here keeps that cost out of the first real requests. /ready only
+    reports ready once this has finished.
+    """
+    try:
+        if PRELOAD_MODELS:
+            with startup_phase("stage1_model"):
+                validator.load_blip()
+            images = [
+                Image.frombytes("RGB", (384, 384), os.urandom(384 * 384 * 3))
+                for _ in range(WARMUP_ITERATIONS)
+            ]
+            with startup_phase("stage1_warmup"):
+                for image in images:
+                    validator.generate_captions([image])
+            if detector.model is not None:
+                with startup_phase("stage2_warmup"):
+                    for image in images:
+                        detector.predict_batch([PREPROCESS(image)])
+        startup_state["ready"] = True
+    except Exception as e:
+        startup_state["error"] = str(e)
+        startup_log.error("Warm-up failed, service stays not ready: %s", e)
+
+    startup_state["phases"]["total"] = round(time.perf_counter() - STARTUP_BEGAN, 3)
+    startup_log.info("total: %.2fs (ready=%s)", startup_state["phases"]["total"], startup_state["ready"])
+
+
+startup_state["phases"]["imports"] = round(time.perf_counter() - STARTUP_BEGAN, 3)
+startup_log.info("imports: %.2fs", startup_state["phases"]["imports"])
+
 validator = MedicalImageValidator()
-detector = DiseaseDetector()
+with startup_phase("stage2_model"):
+    detector = DiseaseDetector()
+result_cache = ResultCache(
+    max_entries=INFERENCE_CACHE_SIZE,
+    ttl_seconds=INFERENCE_CACHE_TTL,
+    db_path=INFERENCE_CACHE_PATH or None
+)
 
 
 # =========================
 # API Endpoints
 # =========================
+def cache_lookup(stage, key):
+    """result_cache.get that also counts cache-served inferences"""
+    with tracing.span("cache_lookup", stage=stage) as span:
+        cached = result_cache.get(key)
+        span.set(hit=cached is not None)
+    if cached is not None:
+        INFERENCE_TOTAL.labels(stage, "cache").inc()
+    return cached
+
+
 @app.route("/validate", methods=["POST"])
 def validate():
     if "image" not in request.files:
         return jsonify({"valid": False, "message": "No image provided"}), 400
 
-    valid, caption, reason = validator.validate_image(request.files["image"])
-    return jsonify({
+    image_bytes = request.files["image"].read()
+    cache_key = ResultCache.make_key(image_bytes, validator.model_version)
+    cached = cache_lookup("stage1", cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    try:
+        valid, caption, reason = validator.validate_image(io.BytesIO(image_bytes))
+    except ValidatorError as e:
+        return jsonify({"valid": False, "caption": None, "error": str(e)}), 503
+    result = {
         "valid": valid,
         "caption": caption,
         "reason": reason
+    }
+    # A missing caption means the image could not be processed; retry next time
+    if caption is not None:
+        result_cache.put(cache_key, result)
+    return jsonify(result)
+
+
+@app.route("/validate_batch", methods=["POST"])
+def validate_batch():
+    images = request.files.getlist("images")
+    if not images:
+        return jsonify({"success": False, "message": "No images provided"}), 400
+
+    results = [None] * len(images)
+    pending = []
+    for i, image in enumerate(images):
+        image_bytes = image.read()
+        cache_key = ResultCache.make_key(image_bytes, validator.model_version)
+        cached = cache_lookup("stage1", cache_key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append((i, cache_key, io.BytesIO(image_bytes)))
+
+    try:
+        outcomes = validator.validate_images([image_file for _, _, image_file in pending])
+    except ValidatorError as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+    for (i, cache_key, _), (valid, caption, reason) in zip(pending, outcomes):
+        results[i] = {
+            "valid": valid,
+            "caption": caption,
+            "reason": reason
+        }
+        if caption is not None:
+            result_cache.put(cache_key, results[i])
+
+    return jsonify({
+        "success": True,
+        "results": [
+            dict(result, filename=image.filename)
+            for image, result in zip(images, results)
+        ]
     })
 
 
@@ -163,22 +513,130 @@ def detect():
     if "image" not in request.files:
         return jsonify({"success": False, "message": "No image provided"}), 400
 
-    disease, confidence = detector.detect_disease(request.files["image"])
-    return jsonify({
+    image_bytes = request.files["image"].read()
+
+    # The random fallback has no stable version, so it is never cached
+    cache_key = None
+    if detector.model_version is not None:
+        cache_key = ResultCache.make_key(image_bytes, detector.model_version)
+        cached = cache_lookup("stage2", cache_key)
+        if cached is not None:
+            return jsonify(cached)
+
+    disease, confidence = detector.detect_disease(io.BytesIO(image_bytes))
+    result = {
         "success": True,
         "disease": disease,
         "confidence": confidence
-    })
+    }
+    if cache_key is not None:
+        result_cache.put(cache_key, result)
+    return jsonify(result)
+
+
+@app.route("/analyze", methods=["POST"])
+def analyze():
+    """Stage 1 + Stage 2 in one request with a single image decode.
+
+    Stage 2 is skipped when Stage 1 rejects the image. When the validator is
+    unavailable Stage 2 still runs, as on /detect, and the reply has
+    ``validated`` false. Each stage result is looked up in and stored to the
+    same cache entries as /validate and /detect, and the image is only
+    decoded if a stage actually has to run.
+    """
+    if "image" not in request.files:
+        return jsonify({"success": False, "message": "No image provided"}), 400
+
+    image_bytes = request.files["image"].read()
+    digest = ResultCache.digest(image_bytes)
+    image = None
+    validation_error = None
+
+    validate_key = ResultCache.key_for_digest(digest, validator.model_version)
+    validation = cache_lookup("stage1", validate_key)
+    if validation is None:
+        try:
+            with stage_timer("decode"):
+                image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        except Exception as e:
+            return jsonify({"valid": False, "caption": None, "reason": str(e), "stage2_skipped": True})
+        try:
+            valid, caption, reason = validator.validate_rgb(image)
+        except ValidatorError as e:
+            # No verdict either way; Stage 2 does not depend on Stage 1
+            validation_error = str(e)
+            valid, caption, reason = None, None, None
+        validation = {
+            "valid": valid,
+            "caption": caption,
+            "reason": reason
+        }
+        if caption is not None:
+            result_cache.put(validate_key, validation)
+
+    result = dict(
+        validation,
+        validated=validation_error is None,
+        stage2_skipped=validation["valid"] is False
+    )
+    if validation_error is not None:
+        result["validation_error"] = validation_error
+    if result["stage2_skipped"]:
+        return jsonify(result)
+
+    detect_key = None
+    detection = None
+    if detector.model_version is not None:
+        detect_key = ResultCache.key_for_digest(digest, detector.model_version)
+        detection = cache_lookup("stage2", detect_key)
+    if detection is None:
+        if image is None:
+            with stage_timer("decode"):
+                image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        disease, confidence = detector.detect_rgb(image)
+        detection = {
+            "success": True,
+            "disease": disease,
+            "confidence": confidence
+        }
+        if detect_key is not None:
+            result_cache.put(detect_key, detection)
+
+    result.update(disease=detection["disease"], confidence=detection["confidence"])
+    return jsonify(result)
 
 
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({
         "status": "healthy",
+        "ready": startup_state["ready"],
         "blip_loaded": validator.model is not None,
-        "disease_model_loaded": detector.model is not None
+        "validate_mode": validator.mode,
+        "disease_model_loaded": detector.model is not None,
+        "detect_engine": detector.engine.name if detector.engine else None,
+        "validate_batching": validator.batcher.stats(),
+        "detect_batching": detector.batcher.stats(),
+        "inference_cache": result_cache.stats(),
+        "tracing": tracing.stats(),
+        "logging": logs.stats()
     })
 
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus text exposition; aggregated over workers under gunicorn"""
+    return Response(observability.metrics.render(metrics.REGISTRY), content_type=observability.metrics.CONTENT_TYPE)
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 503 until the startup warm-up has finished"""
+    return jsonify(startup_state), 200 if startup_state["ready"] else 503
+
+
 if __name__ == "__main__":
+    # Development server; use gunicorn -c gunicorn.conf.py main:app for production
+    set_torch_threads(TORCH_NUM_THREADS)
+    warm_up()
     app.run(host="0.0.0.0", port=5001)
@@ -0,0 +1,41 @@
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+from observability.metrics import DB_BUCKETS, LATENCY_BUCKETS
+
+
+# =========================
+# AI-service metrics
+# =========================
+# Definitions only; observability.metrics serves them on /metrics (summed
+# over the gunicorn workers) and records the per-request series.
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+REGISTRY = CollectorRegistry()
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to produce a response, by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled, by route", ["route"],
+    multiprocess_mode="livesum", registry=REGISTRY
+)
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds", "Time spent per pipeline stage, including batching waits", ["stage"],
+    buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+INFERENCE_TOTAL = Counter(
+    "inference_total", "Images classified or captioned, by stage and source (model, cache or fallback)",
+    ["stage", "source"], registry=REGISTRY
+)
+INFERENCE_SECONDS = Histogram(
+    "inference_batch_duration_seconds", "Model forward/generate time per batch", ["stage"],
+    buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "inference_batch_size", "Images per model call", ["stage"], buckets=BATCH_BUCKETS, registry=REGISTRY
+)
+DB_SECONDS = Histogram(
+    "sqlite_query_duration_seconds", "Result-cache SQLite time by operation", ["kind"],
+    buckets=DB_BUCKETS, registry=REGISTRY
+)
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import DB_SECONDS
+
+log = logging.getLogger("cache")
+
+
+# =========================
+# Content-addressed inference cache
+# =========================
+class ResultCache:
+    """Two-tier cache of inference results keyed by image hash + model version.
+
+    The first tier is an in-process LRU bounded by ``max_entries`` and
+    ``ttl_seconds``. The second tier is a SQLite file that survives restarts;
+    disk hits are promoted back into memory. Pass ``db_path=None`` to keep the
+    cache in memory only.
+
+    The LRU has its own lock, which is never held across disk I/O, so memory
+    hits do not wait behind another thread's SQLite read or commit.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=86400, db_path=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.db_path = db_path
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self._db_lock = threading.Lock()
+
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+
+    @staticmethod
+    def digest(image_bytes):
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    @staticmethod
+    def key_for_digest(digest, model_version):
+        return f"{digest}:{model_version}"
+
+    @classmethod
+    def make_key(cls, image_bytes, model_version):
+        return cls.key_for_digest(cls.digest(image_bytes), model_version)
+
+    # -------------------------
+    # SQLite tier
+    # -------------------------
+    def _connection(self):
+        # Call with _db_lock held. A connection must not be shared across
+        # fork(), so reopen per process
+        if self._db is None or self._db_pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS inference_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _disk_get(self, key, now):
+        with self._db_lock:
+            db = self._connection()
+            with DB_SECONDS.labels("cache_get").time():
+                row = db.execute(
+                    "SELECT value, created_at FROM inference_cache WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                db.execute("DELETE FROM inference_cache WHERE key = ?", (key,))
+                db.commit()
+                expired = True
+            else:
+                expired = False
+        if expired:
+            with self._lock:
+                self.counters["expirations"] += 1
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _disk_put(self, key, value, now):
+        encoded = json.dumps(value)
+        with self._db_lock:
+            db = self._connection()
+            with DB_SECONDS.labels("cache_put").time():
+                db.execute(
+                    "INSERT OR REPLACE INTO inference_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, encoded, now)
+                )
+                db.commit()
+
+    # -------------------------
+    # Public API
+    # -------------------------
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return dict(entry[0])
+                del self._memory[key]
+                self.counters["expirations"] += 1
+
+        found = None
+        if self.db_path:
+            try:
+                found = self._disk_get(key, now)
+            except sqlite3.Error as e:
+                log.error("Disk lookup failed: %s", e)
+
+        with self._lock:
+            if found is None:
+                self.counters["misses"] += 1
+                return None
+            # A put() that ran during the disk read holds the newer value
+            if key not in self._memory:
+                self._remember(key, found[0], found[1])
+            self.counters["disk_hits"] += 1
+            return dict(found[0])
+
+    def put(self, key, value):
+        now = time.time()
+        value = dict(value)
+        with self._lock:
+            self._remember(key, value, now)
+        if self.db_path:
+            try:
+                self._disk_put(key, value, now)
+            except sqlite3.Error as e:
+                log.error("Disk write failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            stats["memory_entries"] = len(self._memory)
+            stats["max_entries"] = self.max_entries
+            stats["ttl_seconds"] = self.ttl
+            stats["persistent"] = bool(self.db_path)
+            return stats
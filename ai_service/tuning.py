@@ -0,0 +1,42 @@
+import json
+import logging
+import os
+
+
+# =========================
+# Tuned serving settings
+# =========================
+# autotune.py writes the best workers / threads / batch sizes it measured to
+# AI_TUNING_PATH. At startup every setting is resolved as: environment
+# variable if set, else the tuned value, else the built-in default.
+
+TUNING_PATH = os.environ.get("AI_TUNING_PATH", "models/tuning.json")
+TUNED_SETTINGS = ("AI_WORKERS", "TORCH_NUM_THREADS", "DETECT_MAX_BATCH_SIZE", "VALIDATE_MAX_BATCH_SIZE")
+
+_tuned = None
+
+
+def load_tuning(path=TUNING_PATH):
+    """Return the tuned settings dict, or {} when there is no usable file"""
+    global _tuned
+    if _tuned is None:
+        _tuned = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    settings = json.load(f).get("settings", {})
+                _tuned = {k: v for k, v in settings.items() if k in TUNED_SETTINGS}
+                logging.getLogger("tuning").info("Using %s: %s", path, _tuned)
+            except (OSError, ValueError, AttributeError) as e:
+                logging.getLogger("tuning").warning("Ignoring unreadable %s: %s", path, e)
+    return _tuned
+
+
+def setting(name, default):
+    """Resolve one setting as a string, like os.environ.get"""
+    if name in os.environ:
+        return os.environ[name]
+    tuned = load_tuning()
+    if name in tuned:
+        return str(tuned[name])
+    return default
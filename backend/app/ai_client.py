@@ -0,0 +1,245 @@
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import AI_CALLS
+from observability import tracing
+
+
+class AIServiceError(Exception):
+    """The AI service could not be reached or returned an unusable reply"""
+
+
+class CircuitOpenError(AIServiceError):
+    """Calls are short-circuited because the AI service keeps failing"""
+
+
+class CircuitBreaker:
+    """Classic closed -> open -> half-open breaker.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    every call fails immediately for ``reset_timeout`` seconds. Then a single
+    trial call is let through; success closes the breaker, failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # Half-open: exactly one trial call at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class MultipartImageStream:
+    """File-like multipart/form-data body with a single ``image`` field.
+
+    The image bytes are pulled chunk by chunk from ``source`` (anything with
+    ``size`` and ``read_at(offset, size)``, or plain bytes) while the request
+    is sent, instead of being copied into one encoded body up front.
+    ``__len__`` lets requests send a Content-Length rather than chunking.
+    """
+
+    def __init__(self, source, filename='image.jpg', content_type='image/jpeg'):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = _BytesSource(source)
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('ascii')
+        self._source = source
+        self._length = len(self._head) + source.size + len(self._tail)
+        self._offset = 0
+
+    def __len__(self):
+        return self._length - self._offset
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length - self._offset
+        parts = []
+        while size > 0 and self._offset < self._length:
+            chunk = self._read_part(size)
+            self._offset += len(chunk)
+            size -= len(chunk)
+            parts.append(chunk)
+        if len(parts) == 1:
+            return parts[0]
+        return b''.join(parts)
+
+    def _read_part(self, size):
+        head_len = len(self._head)
+        body_end = head_len + self._source.size
+        if self._offset < head_len:
+            return self._head[self._offset:self._offset + size]
+        if self._offset < body_end:
+            return self._source.read_at(self._offset - head_len, min(size, body_end - self._offset))
+        start = self._offset - body_end
+        return self._tail[start:start + size]
+
+
+class _BytesSource:
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self.size = len(self._view)
+
+    def read_at(self, offset, size):
+        return self._view[offset:offset + size]
+
+
+class AIServiceClient:
+    """Shared keep-alive client for the AI service.
+
+    One ``requests.Session`` with a bounded connection pool is reused by all
+    backend threads. Each stage has its own (connect, read) timeout; transient
+    failures are retried a bounded number of times; a circuit breaker stops
+    calls to a dead service so backend workers fail fast instead of blocking.
+    """
+
+    RETRY_STATUSES = (502, 503, 504)
+    # Only failures where the AI service never got the request. Inference is
+    # not idempotent, so a read timeout or a reply cut short is not re-sent:
+    # that would double the load on a service that is already slow.
+    # ConnectTimeout is a ConnectionError.
+    RETRY_ERRORS = (requests.ConnectionError, AIServiceError)
+
+    def __init__(self, base_url, timeouts, max_retries=1, retry_backoff=0.2,
+                 pool_size=16, failure_threshold=5, reset_timeout=30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeouts = timeouts
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def _record(self, stage, elapsed, outcome):
+        AI_CALLS.labels(stage, outcome).inc()
+        with self._stats_lock:
+            stats = self._stats.setdefault(stage, {
+                'calls': 0, 'errors': 0, 'short_circuited': 0,
+                'total_seconds': 0.0, 'max_seconds': 0.0, 'last_seconds': 0.0
+            })
+            stats['calls'] += 1
+            if outcome == 'error':
+                stats['errors'] += 1
+            elif outcome == 'short_circuited':
+                stats['short_circuited'] += 1
+                return
+            stats['total_seconds'] += elapsed
+            stats['last_seconds'] = elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+    def _send(self, stage, path, image, filename):
+        # A fresh stream per attempt, so a retry re-sends from the start
+        body = MultipartImageStream(image, filename)
+        response = self.session.post(
+            f'{self.base_url}{path}', data=body,
+            headers={'Content-Type': body.content_type, **tracing.outgoing_headers()},
+            timeout=self.timeouts.get(stage, self.timeouts.get('default'))
+        )
+        if response.status_code in self.RETRY_STATUSES:
+            raise AIServiceError(f'HTTP {response.status_code}')
+        return response.json()
+
+    def post_image(self, stage, path, image, filename='image.jpg'):
+        """POST one image to the AI service and return the decoded JSON reply.
+
+        ``image`` is either bytes or an uploads.UploadBuffer, which is
+        streamed without being copied into a request body first.
+        """
+        if not self.breaker.allow():
+            self._record(stage, 0.0, 'short_circuited')
+            raise CircuitOpenError(f'{stage}: circuit open, AI service unavailable')
+
+        start = time.perf_counter()
+        last_error = None
+        succeeded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    time.sleep(self.retry_backoff * attempt)
+                try:
+                    with tracing.span('ai_service_call', stage=stage, attempt=attempt + 1):
+                        result = self._send(stage, path, image, filename)
+                except self.RETRY_ERRORS as e:
+                    last_error = e
+                    continue
+                except (ValueError, requests.RequestException, OSError) as e:
+                    # A read timeout, a reply that is not JSON, a redirect loop
+                    # or an unreadable upload counts as one failure, no retry
+                    last_error = e
+                    break
+                succeeded = True
+                self.breaker.record_success()
+                self._record(stage, time.perf_counter() - start, 'ok')
+                return result
+            raise AIServiceError(f'{stage}: {last_error}')
+        finally:
+            # Every other way out counts as a failure, which also releases a
+            # half-open trial call
+            if not succeeded:
+                self.breaker.record_failure()
+                self._record(stage, time.perf_counter() - start, 'error')
+
+    def stats(self):
+        with self._stats_lock:
+            stages = {}
+            for stage, stats in self._stats.items():
+                timed = stats['calls'] - stats['short_circuited']
+                stages[stage] = dict(stats, avg_seconds=stats['total_seconds'] / timed if timed else 0.0)
+        return {'breaker_state': self.breaker.state, 'stages': stages}
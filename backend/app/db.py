@@ -0,0 +1,117 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import DB_SECONDS
+
+
+class Database:
+    """Pooled SQLite access with WAL journaling.
+
+    Idle connections are kept in a bounded pool and handed to one thread at a
+    time. While a thread holds a connection, nested ``connection()`` and
+    ``transaction()`` calls on that thread reuse it, so a helper called from a
+    route joins the route's transaction instead of opening a second one.
+    Connections run in autocommit mode; writes go through ``transaction()``.
+    """
+
+    def __init__(self, path, pool_size=8, busy_timeout_ms=5000, statement_cache_size=128):
+        self.path = path
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.statement_cache_size = statement_cache_size
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Run a block in one write transaction, committing on success"""
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # Already inside an outer transaction on this thread
+                yield conn.cursor()
+                return
+
+            # IMMEDIATE takes the write lock up front so writers queue on the
+            # busy timeout instead of failing on a lock upgrade
+            start = time.perf_counter()
+            conn.execute('BEGIN IMMEDIATE')
+            began = time.perf_counter()
+            DB_SECONDS.labels('begin_wait').observe(began - start)
+            try:
+                yield conn.cursor()
+                commit_start = time.perf_counter()
+                conn.execute('COMMIT')
+                DB_SECONDS.labels('commit').observe(time.perf_counter() - commit_start)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            finally:
+                DB_SECONDS.labels('transaction').observe(time.perf_counter() - began)
+
+    def query(self, sql, params=()):
+        with self.connection() as conn, DB_SECONDS.labels('read').time():
+            return conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        with self.connection() as conn, DB_SECONDS.labels('read').time():
+            return conn.execute(sql, params).fetchone()
+
+    def execute(self, sql, params=()):
+        """Run a single write statement in its own transaction"""
+        with self.transaction() as cursor:
+            cursor.execute(sql, params)
+            return cursor
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,71 @@
+import re
+
+
+PATIENT_ID_PREFIX = 'PAVIT-'
+PATIENT_ID_SEQUENCE = 'patient_id'
+_PATIENT_ID_NUMBER = re.compile(r'^PAVIT-(\d+)$')
+
+
+def create_sequence_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            name TEXT PRIMARY KEY,
+            next_value INTEGER NOT NULL
+        )
+    ''')
+
+
+def seed_patient_sequence(cursor):
+    """Start the patient sequence after the highest existing PAVIT number.
+
+    Only inserts when the sequence does not exist yet, so this scan runs once
+    per database rather than once per created patient.
+    """
+    cursor.execute('''
+        INSERT OR IGNORE INTO id_sequences (name, next_value)
+        SELECT ?, COALESCE(MAX(CAST(SUBSTR(id, ?) AS INTEGER)) + 1, 0)
+        FROM patients WHERE id LIKE ?
+    ''', (PATIENT_ID_SEQUENCE, len(PATIENT_ID_PREFIX) + 1, PATIENT_ID_PREFIX + '%'))
+
+
+def allocate(cursor, name, count=1):
+    """Reserve ``count`` consecutive values and return the first one.
+
+    Must run inside a write transaction so the read-increment is atomic;
+    the UPDATE takes the write lock before the value is read back.
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+    cursor.execute(
+        'UPDATE id_sequences SET next_value = next_value + ? WHERE name = ?',
+        (count, name)
+    )
+    if cursor.rowcount != 1:
+        raise LookupError(f'Unknown sequence: {name}')
+    cursor.execute('SELECT next_value FROM id_sequences WHERE name = ?', (name,))
+    return cursor.fetchone()[0] - count
+
+
+def advance_past(cursor, patient_id):
+    """Move the patient sequence past an ID that a caller chose itself.
+
+    Run in the transaction that inserts the patient, so the allocator can
+    never hand the same PAVIT number out again. IDs outside the PAVIT-
+    namespace cannot collide and leave the sequence alone.
+    """
+    match = _PATIENT_ID_NUMBER.match(patient_id)
+    if match:
+        cursor.execute(
+            'UPDATE id_sequences SET next_value = MAX(next_value, ?) WHERE name = ?',
+            (int(match.group(1)) + 1, PATIENT_ID_SEQUENCE)
+        )
+
+
+def format_patient_id(number):
+    return f"{PATIENT_ID_PREFIX}{number:05d}"
+
+
+def allocate_patient_ids(cursor, count=1):
+    """Reserve a block of patient IDs, e.g. for a bulk import"""
+    first = allocate(cursor, PATIENT_ID_SEQUENCE, count)
+    return [format_patient_id(n) for n in range(first, first + count)]
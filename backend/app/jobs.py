@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+
+log = logging.getLogger('jobs')
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+TERMINAL_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED)
+
+
+class JobError(Exception):
+    """Raised by a job handler for an expected failure; the message is kept"""
+
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_created
+        ON jobs (status, created_at)
+    ''')
+
+
+def add_run_after(cursor):
+    # A retried job waits out its backoff in the table rather than in a
+    # worker thread: _claim skips it until run_after (epoch seconds)
+    cursor.execute('ALTER TABLE jobs ADD COLUMN run_after REAL NOT NULL DEFAULT 0')
+
+
+def add_leases(cursor):
+    # A running job belongs to the process named in claimed_by only while
+    # lease_until (epoch seconds) is in the future; the owner keeps renewing
+    # it, so an expired lease means the owner died
+    cursor.execute('ALTER TABLE jobs ADD COLUMN claimed_by TEXT')
+    cursor.execute('ALTER TABLE jobs ADD COLUMN lease_until REAL NOT NULL DEFAULT 0')
+
+
+class JobQueue:
+    """Durable SQLite-backed job queue drained by a pool of worker threads.
+
+    Jobs are rows in the ``jobs`` table, so queued work survives a restart.
+    Several processes may serve the same database: a claimed job carries a
+    lease held by the claiming process, which renews it every
+    ``lease_seconds / 3`` while the job runs. Only a job whose lease has
+    expired, because its process crashed or hung, is queued again. Workers
+    are woken immediately on enqueue and also poll every ``poll_interval``
+    seconds so jobs enqueued by another process (or whose retry backoff has
+    passed) are seen.
+
+    Once a handler has returned, the job is never run again by this
+    process: only its outcome is written, retrying transient SQLite errors.
+    """
+
+    RECORD_ATTEMPTS = 5
+
+    def __init__(self, db, handler, workers=2, poll_interval=1.0, max_attempts=3,
+                 lease_seconds=30.0):
+        self.db = db
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._changed = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self._owner = None
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the workers in this process; later calls return at once.
+
+        Safe to call on every request. A forked child, which inherits no
+        threads, starts its own and claims jobs under its own name. Jobs
+        another live process is running are left alone.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._owner = f"{socket.gethostname()}:{os.getpid()}"
+            self._held = set()
+            self._held_lock = threading.Lock()
+            self._requeue_expired()
+            self._threads = [
+                threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+            ]
+            for i in range(self.workers):
+                self._threads.append(
+                    threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                )
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+            log.info('Started %d workers as %s', self.workers, self._owner)
+
+    def enqueue(self, payload):
+        job_id = uuid.uuid4().hex
+        self.db.execute('''
+            INSERT INTO jobs (id, status, payload) VALUES (?, ?, ?)
+        ''', (job_id, STATUS_QUEUED, json.dumps(payload)))
+        self._notify()
+        return job_id
+
+    def get(self, job_id):
+        row = self.db.query_one('''
+            SELECT id, status, result, error, attempts, created_at, started_at, finished_at
+            FROM jobs WHERE id = ?
+        ''', (job_id,))
+        if row is None:
+            return None
+        return {
+            'job_id': row[0],
+            'status': row[1],
+            'result': json.loads(row[2]) if row[2] else None,
+            'error': row[3],
+            'attempts': row[4],
+            'created_at': row[5],
+            'started_at': row[6],
+            'finished_at': row[7]
+        }
+
+    def wait_for_change(self, timeout):
+        """Block until some job changes state in this process, or timeout"""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _claim(self):
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                SELECT id, payload FROM jobs WHERE status = ? AND run_after <= ?
+                ORDER BY created_at LIMIT 1
+            ''', (STATUS_QUEUED, time.time()))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute('''
+                UPDATE jobs SET status = ?, attempts = attempts + 1,
+                       started_at = CURRENT_TIMESTAMP, claimed_by = ?, lease_until = ?
+                WHERE id = ?
+            ''', (STATUS_RUNNING, self._owner, time.time() + self.lease_seconds, row[0]))
+            return row[0], json.loads(row[1])
+
+    def _heartbeat(self):
+        """Renew the leases of jobs this process is running; re-queue dead ones"""
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._held_lock:
+                held = list(self._held)
+            try:
+                if held:
+                    lease_until = time.time() + self.lease_seconds
+                    with self.db.transaction() as cursor:
+                        cursor.executemany('''
+                            UPDATE jobs SET lease_until = ? WHERE id = ? AND claimed_by = ?
+                        ''', [(lease_until, job_id, self._owner) for job_id in held])
+                self._requeue_expired()
+            except Exception as e:
+                log.error('Lease renewal failed: %s', e)
+
+    def _requeue_expired(self):
+        cursor = self.db.execute('''
+            UPDATE jobs SET status = ?, started_at = NULL
+            WHERE status = ? AND lease_until < ?
+        ''', (STATUS_QUEUED, STATUS_RUNNING, time.time()))
+        if cursor.rowcount:
+            log.warning('Re-queued %d jobs whose worker stopped renewing its lease', cursor.rowcount)
+            self._notify()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        cursor = self.db.execute('''
+            UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND claimed_by = ?
+        ''', (status, json.dumps(result) if result is not None else None, error, job_id, self._owner))
+        if cursor.rowcount == 0:
+            log.warning('Job %s was claimed by another process; not recording this run', job_id)
+        self._notify()
+
+    def _run(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                log.error('Claim failed: %s', e)
+                claimed = None
+
+            if claimed is None:
+                with self._changed:
+                    self._changed.wait(self.poll_interval)
+                continue
+
+            job_id, payload = claimed
+            with self._held_lock:
+                self._held.add(job_id)
+            self._notify()
+            try:
+                result = self.handler(payload)
+            except JobError as e:
+                self._record(job_id, self._finish, STATUS_FAILED, error=str(e))
+            except Exception as e:
+                log.exception('Job %s failed', job_id)
+                self._record(job_id, self._retry_or_fail, str(e))
+            else:
+                # The handler's work (the stored report) is done; a failure
+                # from here on must not make the job run a second time
+                self._record(job_id, self._finish, STATUS_SUCCEEDED, result=result)
+            finally:
+                with self._held_lock:
+                    self._held.discard(job_id)
+
+    def _record(self, job_id, update, *args, **kwargs):
+        """Write a job's outcome with ``update``, retrying SQLite errors"""
+        for attempt in range(1, self.RECORD_ATTEMPTS + 1):
+            try:
+                update(job_id, *args, **kwargs)
+                return True
+            except sqlite3.Error as e:
+                log.warning('Recording job %s failed (attempt %d): %s', job_id, attempt, e)
+                time.sleep(0.1 * attempt)
+        log.error('Gave up recording job %s; it is re-queued when its lease expires', job_id)
+        return False
+
+    def _retry_or_fail(self, job_id, error):
+        row = self.db.query_one('SELECT attempts FROM jobs WHERE id = ?', (job_id,))
+        if row and row[0] < self.max_attempts:
+            # Back off so a flapping dependency is not hammered; the worker
+            # moves on and _claim leaves the job alone until run_after
+            delay = min(self.poll_interval * row[0], 10)
+            self.db.execute('''
+                UPDATE jobs SET status = ?, error = ?, started_at = NULL, run_after = ?
+                WHERE id = ? AND claimed_by = ?
+            ''', (STATUS_QUEUED, error, time.time() + delay, job_id, self._owner))
+            self._notify()
+        else:
+            self._finish(job_id, STATUS_FAILED, error=error)
@@ -0,0 +1,133 @@
+import csv
+import hashlib
+import logging
+import os
+import threading
+import time
+
+
+log = logging.getLogger('stage3')
+
+STRENGTH_MAP = {'high': 0.9, 'medium': 0.7, 'low': 0.5}
+
+
+class KnowledgeBaseSnapshot:
+    """Immutable view of both Stage-3 CSV files, indexed for lookup"""
+
+    def __init__(self, disease_index, nutrition, version, fingerprints):
+        self.disease_index = disease_index
+        self.nutrition = nutrition
+        self.version = version
+        self.fingerprints = fingerprints
+
+
+class KnowledgeBase:
+    """In-memory disease->vitamins and vitamin->nutrition index with hot reload.
+
+    Both CSV files are parsed once. On access the files are re-stat'ed at most
+    every ``check_interval`` seconds; a file is only re-read when its mtime or
+    size changed, and the index is only rebuilt when its content hash changed.
+    Readers always see a complete snapshot because the swap is one assignment.
+    """
+
+    def __init__(self, mapping_path, nutrition_path, check_interval=1.0):
+        self.mapping_path = mapping_path
+        self.nutrition_path = nutrition_path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._stats = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # Loading
+    # -------------------------
+    def _stat(self, path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        return data, hashlib.sha256(data).hexdigest()
+
+    def _parse_mapping(self, data):
+        index = {}
+        reader = csv.DictReader(data.decode('utf-8').splitlines())
+        for row in reader:
+            entry = {
+                'vitamin': row['vitamin'],
+                'association_strength': STRENGTH_MAP.get(row['association_strength'], 0.5),
+                'confidence_note': row['confidence_note'],
+                'source_type': row['source_type']
+            }
+            index.setdefault(row['disease_name'].lower(), []).append(entry)
+
+        # Stable sort keeps CSV order for equal strengths
+        for entries in index.values():
+            entries.sort(key=lambda x: x['association_strength'], reverse=True)
+        return index
+
+    def _parse_nutrition(self, data):
+        nutrition = {}
+        reader = csv.DictReader(data.decode('utf-8').splitlines())
+        for row in reader:
+            nutrition[row['vitamin']] = {
+                'foods': row['foods'].split(';'),
+                'notes': row['notes']
+            }
+        return nutrition
+
+    def _refresh(self):
+        stats = (self._stat(self.mapping_path), self._stat(self.nutrition_path))
+        if self._snapshot is not None and stats == self._stats:
+            return
+
+        mapping_data, mapping_hash = self._read(self.mapping_path)
+        nutrition_data, nutrition_hash = self._read(self.nutrition_path)
+        fingerprints = (mapping_hash, nutrition_hash)
+
+        if self._snapshot is None or fingerprints != self._snapshot.fingerprints:
+            version = hashlib.sha256(
+                (mapping_hash + nutrition_hash).encode('ascii')
+            ).hexdigest()[:12]
+            self._snapshot = KnowledgeBaseSnapshot(
+                self._parse_mapping(mapping_data),
+                self._parse_nutrition(nutrition_data),
+                version,
+                fingerprints
+            )
+            log.info('Knowledge base loaded (version %s)', version)
+
+        self._stats = stats
+
+    def snapshot(self):
+        """Return the current snapshot, reloading if the files changed"""
+        now = time.monotonic()
+        if self._snapshot is None or now - self._last_check >= self.check_interval:
+            with self._lock:
+                if self._snapshot is None or now - self._last_check >= self.check_interval:
+                    try:
+                        self._refresh()
+                    except (OSError, KeyError, UnicodeDecodeError) as e:
+                        # Keep serving the last good snapshot on a bad reload
+                        if self._snapshot is None:
+                            raise
+                        log.error('Knowledge base reload failed: %s', e)
+                    self._last_check = now
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    # -------------------------
+    # Lookups
+    # -------------------------
+    def vitamins_for(self, disease):
+        """Vitamins linked to a disease, strongest association first"""
+        key = disease.lower().replace(' ', '_')
+        return [dict(entry) for entry in self.snapshot().disease_index.get(key, ())]
+
+    def nutrition_for(self, vitamin):
+        return self.snapshot().nutrition.get(vitamin)
@@ -1,57 +1,86 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
-import sqlite3
 from datetime import datetime
-import requests
 from PIL import Image
 import json
-import csv
+import base64
+import logging
+from contextlib import contextmanager
+from werkzeug.serving import is_running_from_reloader
+
+from ai_client import AIServiceClient, AIServiceError
+from db import Database
+import id_allocator
+import jobs
+import metrics
+import migrations
+import report_vitamins
+import rollups
+import uploads
+from knowledge_base import KnowledgeBase
+import observability.metrics
+from observability import logs, tracing
+
+logs.configure('backend')
+log = logging.getLogger('api')
+stage3_log = logging.getLogger('stage3')
 
 app = Flask(__name__)
+app.request_class = uploads.UploadRequest
 CORS(app)
+observability.metrics.instrument(app, metrics.REQUEST_SECONDS, metrics.REQUESTS_IN_FLIGHT)
+tracing.instrument(app)
 
 # Configuration
-UPLOAD_FOLDER = '/app/data/uploads'
-DATABASE_PATH = '/app/data/database/vitamin_system.db'
-DISEASE_VITAMIN_CSV = '/app/data/disease_vitamin_mapping.csv'
-VITAMIN_NUTRITION_CSV = '/app/data/vitamin_nutrition.csv'
-AI_SERVICE_URL = 'http://ai_service:5001'
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', '/app/data/uploads')
+DATABASE_PATH = os.environ.get('DATABASE_PATH', '/app/data/database/vitamin_system.db')
+DISEASE_VITAMIN_CSV = os.environ.get('DISEASE_VITAMIN_CSV', '/app/data/disease_vitamin_mapping.csv')
+VITAMIN_NUTRITION_CSV = os.environ.get('VITAMIN_NUTRITION_CSV', '/app/data/vitamin_nutrition.csv')
+AI_SERVICE_URL = os.environ.get('AI_SERVICE_URL', 'http://ai_service:5001')
+TRACE_PATH = os.environ.get('TRACE_PATH', '/app/data/traces/backend.jsonl')
+AI_CONNECT_TIMEOUT = 2.0
+AI_READ_TIMEOUTS = {'validate': 60.0, 'detect': 30.0, 'analyze': 90.0}
+AI_MAX_RETRIES = 1
+AI_BREAKER_FAILURE_THRESHOLD = 5
+AI_BREAKER_RESET_SECONDS = 30.0
+DB_POOL_SIZE = 8
+DB_BUSY_TIMEOUT_MS = 5000
+PATIENTS_DEFAULT_PAGE_SIZE = 100
+PATIENTS_MAX_PAGE_SIZE = 1000
+ANALYSIS_WORKERS = 2
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Request spans go to a JSONL file; an empty TRACE_PATH writes nothing
+tracing.configure('backend', TRACE_PATH)
+
+# Stage-3 CSVs are parsed once and reloaded only when they change on disk
+knowledge_base = KnowledgeBase(DISEASE_VITAMIN_CSV, VITAMIN_NUTRITION_CSV)
+
+# Every route goes through this pool instead of opening its own connection
+db = Database(DATABASE_PATH, pool_size=DB_POOL_SIZE, busy_timeout_ms=DB_BUSY_TIMEOUT_MS)
+
+# One keep-alive client for all calls to the AI service
+ai_client = AIServiceClient(
+    AI_SERVICE_URL,
+    timeouts={stage: (AI_CONNECT_TIMEOUT, read) for stage, read in AI_READ_TIMEOUTS.items()},
+    max_retries=AI_MAX_RETRIES,
+    failure_threshold=AI_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=AI_BREAKER_RESET_SECONDS
+)
+
+@contextmanager
+def pipeline_stage(name):
+    """Time one analysis stage as a metric and as a span of the request's trace"""
+    with metrics.STAGE_SECONDS.labels(name).time(), tracing.span(name):
+        yield
+
 def init_database():
-    """Initialize SQLite database with required tables"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS patients (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            phone TEXT,
-            date_of_birth TEXT,
-            address TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reports (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_id TEXT,
-            image_path TEXT,
-            detected_disease TEXT,
-            confidence_score REAL,
-            vitamin_deficiencies TEXT,
-            nutrition_recommendations TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (patient_id) REFERENCES patients (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    """Bring the SQLite schema up to date by applying pending migrations"""
+    version = migrations.migrate(db)
+    logging.getLogger('db').info('Schema version %d', version)
 
 @app.route('/api/patients/create', methods=['POST'])
 def create_patient_new():
@@ -59,89 +88,136 @@ def create_patient_new():
     try:
         data = request.json
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Get the last patient ID with PAVIT format
-        cursor.execute("SELECT id FROM patients WHERE id LIKE 'PAVIT-%' ORDER BY id DESC LIMIT 1")
-        last_patient = cursor.fetchone()
-        
-        if last_patient:
-            # Extract number from PAVIT-00000 format
-            try:
-                last_num = int(last_patient[0].split('-')[1])
-                new_num = last_num + 1
-            except:
-                new_num = 0
-        else:
-            new_num = 0
-        
-        new_patient_id = f"PAVIT-{new_num:05d}"
-        
-        cursor.execute('''
-            INSERT INTO patients (id, name, phone, date_of_birth, address)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (new_patient_id, data['name'], data.get('phone'), 
-              data.get('date_of_birth'), data.get('address')))
+        with db.transaction() as cursor:
+            # The ID is taken from the sequence inside the insert transaction,
+            # so concurrent creates can never receive the same PAVIT number
+            new_patient_id = id_allocator.allocate_patient_ids(cursor)[0]
+            
+            cursor.execute('''
+                INSERT INTO patients (id, name, phone, date_of_birth, address)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (new_patient_id, data['name'], data.get('phone'), 
+                  data.get('date_of_birth'), data.get('address')))
+        
+        log.debug('Created patient %s', new_patient_id)
+        return jsonify({'status': 'success', 'patient_id': new_patient_id})
+    except Exception as e:
+        log.exception('create_patient failed')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/patients/reserve_ids', methods=['POST'])
+def reserve_patient_ids():
+    """Reserve a block of consecutive patient IDs for a bulk import"""
+    try:
+        data = request.json or {}
+        count = int(data.get('count', 1))
+        if count < 1 or count > 10000:
+            return jsonify({'error': 'count must be between 1 and 10000'}), 400
         
-        conn.commit()
-        conn.close()
+        with db.transaction() as cursor:
+            patient_ids = id_allocator.allocate_patient_ids(cursor, count)
         
-        print(f"[DEBUG] Created patient: {new_patient_id}")
-        return jsonify({'status': 'success', 'patient_id': new_patient_id})
+        return jsonify({'status': 'success', 'patient_ids': patient_ids})
     except Exception as e:
-        print(f"[ERROR] create_patient: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error('reserve_patient_ids failed: %s', e)
         return jsonify({'error': str(e)}), 500
 
+def patient_row_to_dict(row):
+    return {
+        'id': row[0],
+        'name': row[1],
+        'phone': row[2] if row[2] else '',
+        'date_of_birth': row[3] if row[3] else '',
+        'address': row[4] if row[4] else '',
+        'created_at': row[5]
+    }
+
+def encode_patient_cursor(patient_id):
+    return base64.urlsafe_b64encode(patient_id.encode('utf-8')).decode('ascii')
+
+def decode_patient_cursor(token):
+    try:
+        patient_id = base64.b64decode(token.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+    except (ValueError, UnicodeError):
+        patient_id = ''
+    if not patient_id:
+        raise ValueError('Invalid cursor')
+    return patient_id
+
+def fetch_patient_page(after_id, limit):
+    """Keyset page on id DESC: rows strictly after ``after_id``, never OFFSET"""
+    if after_id is None:
+        return db.query('''
+            SELECT id, name, phone, date_of_birth, address, created_at 
+            FROM patients ORDER BY id DESC LIMIT ?
+        ''', (limit,))
+    return db.query('''
+        SELECT id, name, phone, date_of_birth, address, created_at 
+        FROM patients WHERE id < ? ORDER BY id DESC LIMIT ?
+    ''', (after_id, limit))
+
 @app.route('/api/patients/all', methods=['GET'])
 def get_all_patients():
-    """Get all patients in descending order"""
+    """Get all patients in descending order.
+
+    Without query parameters the full list is returned as before. Passing
+    ``limit`` and/or ``cursor`` switches to keyset pagination and returns
+    ``{'patients': [...], 'next_cursor': token-or-null}``.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        if 'limit' in request.args or 'cursor' in request.args:
+            try:
+                limit = int(request.args.get('limit', PATIENTS_DEFAULT_PAGE_SIZE))
+                cursor = request.args.get('cursor')
+                after_id = decode_patient_cursor(cursor) if cursor else None
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            limit = max(1, min(limit, PATIENTS_MAX_PAGE_SIZE))
+            
+            # One extra row tells us whether another page exists
+            rows = fetch_patient_page(after_id, limit + 1)
+            patients = [patient_row_to_dict(row) for row in rows[:limit]]
+            next_cursor = encode_patient_cursor(patients[-1]['id']) if len(rows) > limit else None
+            
+            return jsonify({'patients': patients, 'next_cursor': next_cursor})
+        
+        rows = db.query('''
             SELECT id, name, phone, date_of_birth, address, created_at 
             FROM patients ORDER BY id DESC
         ''')
         
-        patients = []
-        for row in cursor.fetchall():
-            patients.append({
-                'id': row[0],
-                'name': row[1],
-                'phone': row[2] if row[2] else '',
-                'date_of_birth': row[3] if row[3] else '',
-                'address': row[4] if row[4] else '',
-                'created_at': row[5]
-            })
+        patients = [patient_row_to_dict(row) for row in rows]
         
-        conn.close()
-        print(f"[DEBUG] Returning {len(patients)} patients")
+        log.debug('Returning %d patients', len(patients))
         return jsonify(patients)
     except Exception as e:
-        print(f"[ERROR] get_all_patients: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception('get_all_patients failed')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/patients/export', methods=['GET'])
+def export_patients():
+    """Stream every patient as NDJSON, one keyset page at a time"""
+    def generate():
+        after_id = None
+        while True:
+            rows = fetch_patient_page(after_id, PATIENTS_MAX_PAGE_SIZE)
+            for row in rows:
+                yield json.dumps(patient_row_to_dict(row)) + '\n'
+            if len(rows) < PATIENTS_MAX_PAGE_SIZE:
+                break
+            after_id = rows[-1][0]
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/patients/<patient_id>', methods=['GET'])
 def get_patient(patient_id):
     """Get single patient by ID"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        row = db.query_one('''
             SELECT id, name, phone, date_of_birth, address, created_at 
             FROM patients WHERE id = ?
         ''', (patient_id,))
         
-        row = cursor.fetchone()
-        conn.close()
-        
         if row:
             return jsonify({
                 'id': row[0],
@@ -154,7 +230,7 @@ def get_patient(patient_id):
         else:
             return jsonify({'error': 'Patient not found'}), 404
     except Exception as e:
-        print(f"[ERROR] get_patient: {str(e)}")
+        log.error('get_patient failed: %s', e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/patients/update', methods=['PUT'])
@@ -163,39 +239,27 @@ def update_patient():
     try:
         data = request.json
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        db.execute('''
             UPDATE patients 
             SET name = ?, phone = ?, date_of_birth = ?, address = ?
             WHERE id = ?
         ''', (data['name'], data.get('phone'), data.get('date_of_birth'), 
               data.get('address'), data['patient_id']))
         
-        conn.commit()
-        conn.close()
-        
         return jsonify({'status': 'success'})
     except Exception as e:
-        print(f"[ERROR] update_patient: {str(e)}")
+        log.error('update_patient failed: %s', e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/patients/<patient_id>', methods=['DELETE'])
 def delete_patient(patient_id):
     """Delete patient"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM patients WHERE id = ?', (patient_id,))
-        
-        conn.commit()
-        conn.close()
+        db.execute('DELETE FROM patients WHERE id = ?', (patient_id,))
         
         return jsonify({'status': 'success'})
     except Exception as e:
-        print(f"[ERROR] delete_patient: {str(e)}")
+        log.error('delete_patient failed: %s', e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/patients', methods=['POST'])
@@ -203,16 +267,17 @@ def create_patient():
     """Create or update patient information"""
     data = request.json
     
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT OR REPLACE INTO patients (id, name, address, phone)
-        VALUES (?, ?, ?, ?)
-    ''', (data['patient_id'], data['name'], data['address'], data['phone']))
-    
-    conn.commit()
-    conn.close()
+    with db.transaction() as cursor:
+        # Update in place rather than REPLACE, which deletes the row and
+        # drops the columns this route does not send
+        cursor.execute('''
+            INSERT INTO patients (id, name, address, phone)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                name = excluded.name, address = excluded.address, phone = excluded.phone
+        ''', (data['patient_id'], data['name'], data['address'], data['phone']))
+        # A caller-chosen PAVIT ID must never be allocated again
+        id_allocator.advance_past(cursor, data['patient_id'])
     
     return jsonify({'status': 'success', 'message': 'Patient created successfully'})
 
@@ -245,132 +310,222 @@ def analyze_stage3():
         })
         
     except Exception as e:
-        print(f"[ERROR] /api/analyze_stage3: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception('/api/analyze_stage3 failed')
         return jsonify({'error': str(e)}), 500
 
+def run_analysis(patient_id, filepath, upload=None):
+    """Stages 2-3 and report storage for an uploaded image.
+
+    ``upload`` is the request's UploadBuffer, possibly still being written to
+    ``filepath`` in the background. Queued jobs pass None and read the file.
+    AIServiceError propagates: the route answers 503 and a queued job is
+    retried, so no report is stored without a real diagnosis.
+    """
+    if upload is None:
+        with uploads.UploadBuffer.from_path(filepath) as saved:
+            return run_analysis(patient_id, filepath, saved)
+    
+    # Stages 1 and 2 in one AI-service call; Stage 2 is skipped on rejection
+    with pipeline_stage('ai_analyze'):
+        disease_result = analyze_medical_image(upload)
+    if not disease_result['is_medical']:
+        return {
+            'status': 'rejected',
+            'message': 'Image is not medical-related.',
+            'reason': disease_result.get('reason')
+        }
+    
+    if not disease_result.get('disease'):
+        raise jobs.JobError('Unable to detect disease')
+    
+    with pipeline_stage('stage3'):
+        with tracing.span('csv_lookup', disease=disease_result['disease']):
+            vitamin_deficiencies = infer_vitamin_deficiencies(disease_result['disease'])
+        with tracing.span('nutrition_lookup', vitamins=len(vitamin_deficiencies)):
+            nutrition_recommendations = get_nutrition_recommendations(vitamin_deficiencies)
+    
+    # The report must not reference an image that failed to persist
+    with pipeline_stage('upload_wait'):
+        upload.wait_saved()
+    with pipeline_stage('db_write'):
+        report_id = store_report(
+            patient_id, filepath, disease_result['disease'],
+            disease_result['confidence'], vitamin_deficiencies, nutrition_recommendations
+        )
+    
+    return {
+        'status': 'success',
+        'report_id': report_id,
+        'detected_disease': disease_result['disease'],
+        'confidence': disease_result['confidence'],
+        'validated': disease_result['validated'],
+        'vitamin_deficiencies': vitamin_deficiencies,
+        'nutrition_recommendations': nutrition_recommendations
+    }
+
+def run_analysis_job(payload):
+    # Queued jobs continue the trace of the request that enqueued them
+    with tracing.start_trace(
+        'analysis_job', payload.get('trace_id'), payload.get('parent_span_id'),
+        patient_id=payload['patient_id']
+    ):
+        return run_analysis(payload['patient_id'], payload['image_path'])
+
+# Durable queue for ?async=1 analyses
+job_queue = jobs.JobQueue(db, run_analysis_job, workers=ANALYSIS_WORKERS)
+
+@app.before_request
+def start_job_workers():
+    # Whatever server imports the app, the process that serves requests
+    # starts the workers; after the first request this returns at once
+    job_queue.start()
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_image():
-    """Main analysis endpoint - orchestrates the 3-stage pipeline"""
+    """Main analysis endpoint - orchestrates the 3-stage pipeline.
+
+    With ``async=1`` (query string or form field) the upload is queued and
+    a job ID is returned at once; poll /api/jobs/<id> or subscribe to
+    /api/jobs/<id>/events for the result.
+    """
     try:
-        patient_id = request.form.get('patient_id')
-        file = request.files.get('image')
+        # Accessing the form makes Werkzeug read and buffer the whole upload
+        with pipeline_stage('upload_receive'):
+            patient_id = request.form.get('patient_id')
+            file = request.files.get('image')
         
         if not file or not patient_id:
             return jsonify({'error': 'Missing patient ID or image'}), 400
         
         filename = f"{patient_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Skip Stage 1 validation for manual Stage 3 calls
-        # validation_result = validate_medical_image(filepath)
-        # if not validation_result['is_medical']:
-        #     return jsonify({
-        #         'status': 'rejected',
-        #         'message': 'Image is not medical-related.'
-        #     })
-        
-        disease_result = detect_disease(filepath)
-        if not disease_result.get('disease'):
-            return jsonify({
-                'status': 'error',
-                'message': 'Unable to detect disease'
-            }), 400
-        
-        vitamin_deficiencies = infer_vitamin_deficiencies(disease_result['disease'])
-        nutrition_recommendations = get_nutrition_recommendations(vitamin_deficiencies)
-        
-        report_id = store_report(
-            patient_id, filepath, disease_result['disease'],
-            disease_result['confidence'], vitamin_deficiencies, nutrition_recommendations
-        )
         
-        return jsonify({
-            'status': 'success',
-            'report_id': report_id,
-            'detected_disease': disease_result['disease'],
-            'confidence': disease_result['confidence'],
-            'vitamin_deficiencies': vitamin_deficiencies,
-            'nutrition_recommendations': nutrition_recommendations
-        })
+        # The upload is buffered once; the same buffer is written to storage
+        # and streamed to the AI service at the same time
+        with uploads.UploadBuffer(file.stream) as upload:
+            run_async = request.values.get('async', '').lower() in ('1', 'true', 'yes')
+            if run_async:
+                # The worker reads the image from storage, so persist it first
+                upload.save(filepath)
+                root = tracing.current_span()
+                job_id = job_queue.enqueue({
+                    'patient_id': patient_id,
+                    'image_path': filepath,
+                    'trace_id': root.trace_id,
+                    'parent_span_id': root.span_id
+                })
+                return jsonify({
+                    'status': 'queued',
+                    'job_id': job_id,
+                    'status_url': f'/api/jobs/{job_id}',
+                    'events_url': f'/api/jobs/{job_id}/events'
+                }), 202
+            
+            upload.save_async(filepath)
+            try:
+                return jsonify(run_analysis(patient_id, filepath, upload))
+            except jobs.JobError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 400
+            except AIServiceError as e:
+                log.warning('AI service unavailable: %s', e)
+                return jsonify({
+                    'status': 'error',
+                    'message': 'AI service unavailable, try again later'
+                }), 503
         
     except Exception as e:
-        print(f"[ERROR] /api/analyze: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception('/api/analyze failed')
         return jsonify({'error': str(e)}), 500
 
-def validate_medical_image(image_path):
-    """Stage 1: Validate if image is medical"""
-    try:
-        response = requests.post(f'{AI_SERVICE_URL}/validate', 
-                               files={'image': open(image_path, 'rb')})
-        result = response.json()
-        return {'is_medical': result.get('valid', True)}
-    except:
-        return {'is_medical': True}
-
-def detect_disease(image_path):
-    """Stage 2: Detect disease from medical image"""
-    try:
-        response = requests.post(f'{AI_SERVICE_URL}/detect', 
-                               files={'image': open(image_path, 'rb')})
-        result = response.json()
-        return {'disease': result.get('disease', 'unknown'), 'confidence': result.get('confidence', 0.5)}
-    except:
-        return {'disease': 'dermatitis', 'confidence': 0.85}
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll an analysis job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events stream of a job's status until it finishes"""
+    if job_queue.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        last_status = None
+        while True:
+            job = job_queue.get(job_id)
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+            if last_status in jobs.TERMINAL_STATUSES:
+                return
+            
+            # Woken early when a job changes in this process; the timeout
+            # doubles as a keep-alive and catches updates from other processes
+            job_queue.wait_for_change(JOB_EVENTS_KEEPALIVE_SECONDS)
+            yield ': keep-alive\n\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def analyze_medical_image(upload):
+    """Stages 1-2: Validate the image and detect disease in one AI-service call.
+
+    Raises AIServiceError when the AI service gives no usable answer; there
+    is no stand-in diagnosis, so nothing is stored for the patient.
+    """
+    result = ai_client.post_image('analyze', '/analyze', upload)
+    validated = result.get('validated', True)
+    if not validated:
+        # Stage 2 still ran; the response says Stage 1 was skipped
+        logging.getLogger('stage1').warning(
+            'Image not validated: %s', result.get('validation_error')
+        )
+    return {
+        'is_medical': result.get('valid') is not False,
+        'validated': validated,
+        'reason': result.get('reason'),
+        'disease': result.get('disease', 'unknown'),
+        'confidence': result.get('confidence', 0.5)
+    }
 
 def infer_vitamin_deficiencies(disease):
-    """Stage 3: Rule-based vitamin inference from CSV"""
+    """Stage 3: Rule-based vitamin inference from the indexed CSV knowledge base"""
     try:
-        vitamin_results = []
         disease_lower = disease.lower().replace(' ', '_')
         
-        strength_map = {'high': 0.9, 'medium': 0.7, 'low': 0.5}
-        
-        print(f"[STAGE-3] Looking up disease: {disease_lower}")
-        
-        with open(DISEASE_VITAMIN_CSV, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['disease_name'].lower() == disease_lower:
-                    strength = strength_map.get(row['association_strength'], 0.5)
-                    vitamin_results.append({
-                        'vitamin': row['vitamin'],
-                        'association_strength': strength,
-                        'confidence_note': row['confidence_note'],
-                        'source_type': row['source_type']
-                    })
-                    print(f"[STAGE-3] Found: {row['vitamin']} (strength: {row['association_strength']})")
-        
-        vitamin_results.sort(key=lambda x: x['association_strength'], reverse=True)
-        
-        print(f"[STAGE-3] Total vitamins found: {len(vitamin_results)}")
+        vitamin_results = knowledge_base.vitamins_for(disease_lower)
+        # Per-row lines are debug-only and sampled; the level check is a
+        # cheap integer comparison when debug logging is off
+        if stage3_log.isEnabledFor(logging.DEBUG):
+            for vit_info in vitamin_results:
+                stage3_log.debug(
+                    'Found: %s (strength: %s)', vit_info['vitamin'], vit_info['association_strength'],
+                    extra=logs.SAMPLED
+                )
+        
+        stage3_log.debug('Disease %s: %d vitamins found', disease_lower, len(vitamin_results))
         return vitamin_results
     except Exception as e:
-        print(f"[STAGE-3] Error: {e}")
+        stage3_log.error('Vitamin lookup failed: %s', e)
         return []
 
 def get_nutrition_recommendations(vitamin_deficiencies):
-    """Get nutrition recommendations from CSV file"""
+    """Get nutrition recommendations from the indexed knowledge base"""
     try:
-        nutrition_data = {}
-        
-        with open(VITAMIN_NUTRITION_CSV, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                nutrition_data[row['vitamin']] = {
-                    'foods': row['foods'].split(';'),
-                    'notes': row['notes']
-                }
-        
         recommendations = []
         for vit_info in vitamin_deficiencies:
             vitamin_name = vit_info['vitamin']
-            if vitamin_name in nutrition_data:
-                rec = nutrition_data[vitamin_name].copy()
+            nutrition = knowledge_base.nutrition_for(vitamin_name)
+            if nutrition is not None:
+                rec = nutrition.copy()
                 rec['vitamin'] = vitamin_name
                 rec['association_strength'] = vit_info['association_strength']
                 rec['confidence_note'] = vit_info['confidence_note']
@@ -379,101 +534,93 @@ def get_nutrition_recommendations(vitamin_deficiencies):
         
         return recommendations
     except Exception as e:
-        print(f"[STAGE-3] Nutrition error: {e}")
+        stage3_log.error('Nutrition lookup failed: %s', e)
         return []
 
 def store_report(patient_id, image_path, disease, confidence, vitamins, recommendations):
     """Store analysis report in database"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO reports (patient_id, image_path, detected_disease, confidence_score, 
-                           vitamin_deficiencies, nutrition_recommendations)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (patient_id, image_path, disease, confidence, 
-          json.dumps(vitamins), json.dumps(recommendations)))
-    
-    report_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with db.transaction() as cursor:
+        cursor.execute('''
+            INSERT INTO reports (patient_id, image_path, detected_disease, confidence_score)
+            VALUES (?, ?, ?, ?)
+        ''', (patient_id, image_path, disease, confidence))
+        
+        report_id = cursor.lastrowid
+        report_vitamins.insert(cursor, report_id, vitamins, recommendations)
+        
+        # Keep the analytics rollups in step with the report, atomically
+        cursor.execute('SELECT created_at FROM reports WHERE id = ?', (report_id,))
+        created_at = cursor.fetchone()[0]
+        rollups.record_report(cursor, patient_id, disease, recommendations, created_at)
     
     return report_id
 
 @app.route('/api/reports/<patient_id>', methods=['GET'])
 def get_patient_reports(patient_id):
-    """Get all reports for a patient"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    """Get all reports for a patient, optionally only those linked to ?vitamin="""
+    vitamin = request.args.get('vitamin')
+    if vitamin:
+        rows = db.query('''
+            SELECT id, patient_id, detected_disease, confidence_score, created_at
+            FROM reports
+            WHERE patient_id = ? AND id IN (SELECT report_id FROM report_vitamins WHERE vitamin = ?)
+            ORDER BY created_at DESC
+        ''', (patient_id, vitamin))
+    else:
+        rows = db.query('''
+            SELECT id, patient_id, detected_disease, confidence_score, created_at
+            FROM reports WHERE patient_id = ? ORDER BY created_at DESC
+        ''', (patient_id,))
     
-    cursor.execute('''
-        SELECT * FROM reports WHERE patient_id = ? ORDER BY created_at DESC
-    ''', (patient_id,))
+    vitamins_by_report = report_vitamins.load_for_patient(db, patient_id)
     
     reports = []
-    for row in cursor.fetchall():
+    for row in rows:
+        deficiencies, recommendations = vitamins_by_report.get(row[0], ([], []))
         reports.append({
             'id': row[0],
             'patient_id': row[1],
-            'detected_disease': row[3],
-            'confidence_score': row[4],
-            'vitamin_deficiencies': json.loads(row[5]) if row[5] else [],
-            'nutrition_recommendations': json.loads(row[6]) if row[6] else [],
-            'created_at': row[7]
+            'detected_disease': row[2],
+            'confidence_score': row[3],
+            'vitamin_deficiencies': deficiencies,
+            'nutrition_recommendations': recommendations,
+            'created_at': row[4]
         })
     
-    conn.close()
     return jsonify(reports)
 
 @app.route('/api/analytics/<patient_id>', methods=['GET'])
 def get_patient_analytics(patient_id):
-    """Get analytics data for charts"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT detected_disease, nutrition_recommendations, created_at 
-        FROM reports WHERE patient_id = ? ORDER BY created_at
-    ''', (patient_id,))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    vitamin_counts = {}
-    disease_counts = {}
-    monthly_counts = {}
-    
-    for row in rows:
-        disease = row[0]
-        recommendations = json.loads(row[1]) if row[1] else []
-        created_at = row[2]
-        
-        disease_counts[disease] = disease_counts.get(disease, 0) + 1
-        
-        for rec in recommendations:
-            vitamin = rec.get('vitamin', '')
-            if vitamin:
-                vitamin_counts[vitamin] = vitamin_counts.get(vitamin, 0) + 1
-        
-        try:
-            month_key = created_at[:7]
-            monthly_counts[month_key] = monthly_counts.get(month_key, 0) + 1
-        except:
-            pass
-    
-    return jsonify({
-        'vitamins': dict(sorted(vitamin_counts.items(), key=lambda x: x[1], reverse=True)[:10]),
-        'diseases': disease_counts,
-        'monthly': dict(sorted(monthly_counts.items()))
-    })
+    """Get analytics data for charts from the per-patient rollups"""
+    return jsonify(rollups.patient_analytics(db, patient_id))
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'service': 'backend'})
+    try:
+        kb_version = knowledge_base.version
+    except Exception:
+        kb_version = None
+    return jsonify({
+        'status': 'healthy',
+        'service': 'backend',
+        'knowledge_base_version': kb_version,
+        'ai_service': ai_client.stats(),
+        'tracing': tracing.stats(),
+        'logging': logs.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of route, stage and SQLite timings"""
+    return Response(observability.metrics.render(metrics.REGISTRY), content_type=observability.metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
     init_database()
+    # Start now so queued jobs resume without waiting for a request; the
+    # debug reloader's parent process only watches files and serves nothing
+    if is_running_from_reloader():
+        job_queue.start()
     app.run(host='0.0.0.0', port=5000, debug=True)
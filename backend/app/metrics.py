@@ -0,0 +1,29 @@
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+from observability.metrics import DB_BUCKETS, LATENCY_BUCKETS
+
+
+# Backend metric definitions; observability.metrics serves them on /metrics
+# and records the per-request series
+REGISTRY = CollectorRegistry()
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being handled, by route', ['route'],
+    multiprocess_mode='livesum', registry=REGISTRY
+)
+STAGE_SECONDS = Histogram(
+    'pipeline_stage_duration_seconds', 'Time spent in each analysis pipeline stage', ['stage'],
+    buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+DB_SECONDS = Histogram(
+    'sqlite_query_duration_seconds', 'SQLite time by operation kind', ['kind'],
+    buckets=DB_BUCKETS, registry=REGISTRY
+)
+AI_CALLS = Counter(
+    'ai_service_calls_total', 'Calls to the AI service by stage and outcome', ['stage', 'outcome'],
+    registry=REGISTRY
+)
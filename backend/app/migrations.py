@@ -0,0 +1,262 @@
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+
+import id_allocator
+import jobs
+import report_vitamins
+import rollups
+
+
+# =========================
+# Migrations
+# =========================
+# Each migration is (version, name, function(cursor)). They run in version
+# order at startup, each in its own transaction, and are recorded in
+# schema_migrations. Never edit a migration that has shipped; add a new one.
+
+def create_base_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patients (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            phone TEXT,
+            date_of_birth TEXT,
+            address TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id TEXT,
+            image_path TEXT,
+            detected_disease TEXT,
+            confidence_score REAL,
+            vitamin_deficiencies TEXT,
+            nutrition_recommendations TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (id)
+        )
+    ''')
+
+    id_allocator.create_sequence_table(cursor)
+    id_allocator.seed_patient_sequence(cursor)
+
+
+def add_report_patient_created_index(cursor):
+    # Serves get_patient_reports and get_patient_analytics: equality on
+    # patient_id plus ordered created_at, so no table scan and no sort
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reports_patient_created
+        ON reports (patient_id, created_at)
+    ''')
+
+
+def add_analytics_rollups(cursor):
+    rollups.create_tables(cursor)
+
+    # Reports still stored their vitamins as JSON at this schema version, so
+    # this backfill reads the blobs rather than calling rollups.backfill.
+    # Like that function, it skips reports that belong to no patient.
+    rows = cursor.execute('''
+        SELECT patient_id, detected_disease, nutrition_recommendations, created_at
+        FROM reports WHERE patient_id IS NOT NULL
+    ''').fetchall()
+    for patient_id, disease, recommendations, created_at in rows:
+        rollups.record_report(
+            cursor, patient_id, disease,
+            json.loads(recommendations) if recommendations else [],
+            created_at
+        )
+
+
+def normalize_report_vitamins(cursor):
+    report_vitamins.create_table(cursor)
+    report_vitamins.convert_json_rows(cursor)
+
+
+MIGRATIONS = [
+    (1, 'base schema', create_base_schema),
+    (2, 'reports (patient_id, created_at) index', add_report_patient_created_index),
+    (3, 'per-patient analytics rollups', add_analytics_rollups),
+    (4, 'normalized report_vitamins', normalize_report_vitamins),
+    (5, 'durable analysis job queue', jobs.create_table),
+    (6, 'job retry backoff (jobs.run_after)', jobs.add_run_after),
+    (7, 'job leases (jobs.claimed_by, jobs.lease_until)', jobs.add_leases),
+]
+
+
+def current_version(db):
+    row = db.query_one('SELECT MAX(version) FROM schema_migrations')
+    return row[0] or 0
+
+
+def migrate(db):
+    """Apply every pending migration and return the resulting schema version"""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    for version, name, apply in MIGRATIONS:
+        with db.transaction() as cursor:
+            # Re-checked under the write lock in case another process migrated
+            cursor.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,))
+            if cursor.fetchone():
+                continue
+            logging.getLogger('db').info('Applying migration %d: %s', version, name)
+            apply(cursor)
+            cursor.execute(
+                'INSERT INTO schema_migrations (version, name) VALUES (?, ?)',
+                (version, name)
+            )
+
+    return current_version(db)
+
+
+# =========================
+# Query plan check
+# =========================
+# Every query a route runs, with representative parameters. Keep this list
+# in sync with main.py when a route query changes.
+ROUTE_QUERIES = [
+    ('get_all_patients', '''
+        SELECT id, name, phone, date_of_birth, address, created_at
+        FROM patients ORDER BY id DESC
+    ''', ()),
+    ('get_all_patients (page)', '''
+        SELECT id, name, phone, date_of_birth, address, created_at
+        FROM patients ORDER BY id DESC LIMIT ?
+    ''', (100,)),
+    ('get_all_patients (keyset page)', '''
+        SELECT id, name, phone, date_of_birth, address, created_at
+        FROM patients WHERE id < ? ORDER BY id DESC LIMIT ?
+    ''', ('PAVIT-00100', 100)),
+    ('get_patient', '''
+        SELECT id, name, phone, date_of_birth, address, created_at
+        FROM patients WHERE id = ?
+    ''', ('PAVIT-00000',)),
+    ('update_patient', '''
+        UPDATE patients
+        SET name = ?, phone = ?, date_of_birth = ?, address = ?
+        WHERE id = ?
+    ''', ('', '', '', '', 'PAVIT-00000')),
+    ('delete_patient', 'DELETE FROM patients WHERE id = ?', ('PAVIT-00000',)),
+    ('allocate patient id', '''
+        UPDATE id_sequences SET next_value = next_value + ? WHERE name = ?
+    ''', (1, id_allocator.PATIENT_ID_SEQUENCE)),
+    ('get_patient_reports', '''
+        SELECT id, patient_id, detected_disease, confidence_score, created_at
+        FROM reports WHERE patient_id = ? ORDER BY created_at DESC
+    ''', ('PAVIT-00000',)),
+    ('get_patient_reports (vitamins)', '''
+        SELECT report_id, vitamin, association_strength, confidence_note,
+               source_type, foods, notes
+        FROM report_vitamins
+        WHERE report_id IN (SELECT id FROM reports WHERE patient_id = ?)
+        ORDER BY report_id, position
+    ''', ('PAVIT-00000',)),
+    ('get_patient_reports (vitamin filter)', '''
+        SELECT id, patient_id, detected_disease, confidence_score, created_at
+        FROM reports
+        WHERE patient_id = ? AND id IN (SELECT report_id FROM report_vitamins WHERE vitamin = ?)
+        ORDER BY created_at DESC
+    ''', ('PAVIT-00000', 'Vitamin D')),
+    ('get_patient_analytics (vitamins)', '''
+        SELECT vitamin, count FROM patient_vitamin_counts WHERE patient_id = ?
+    ''', ('PAVIT-00000',)),
+    ('get_patient_analytics (diseases)', '''
+        SELECT disease, count FROM patient_disease_counts WHERE patient_id = ?
+    ''', ('PAVIT-00000',)),
+    ('get_patient_analytics (monthly)', '''
+        SELECT month, count FROM patient_monthly_counts
+        WHERE patient_id = ? ORDER BY month
+    ''', ('PAVIT-00000',)),
+    ('get_job', '''
+        SELECT id, status, result, error, attempts, created_at, started_at, finished_at
+        FROM jobs WHERE id = ?
+    ''', ('0' * 32,)),
+    ('claim job', '''
+        SELECT id, payload FROM jobs WHERE status = ? AND run_after <= ?
+        ORDER BY created_at LIMIT 1
+    ''', ('queued', 0)),
+    ('renew job lease', '''
+        UPDATE jobs SET lease_until = ? WHERE id = ? AND claimed_by = ?
+    ''', (0, '0' * 32, '')),
+    ('requeue expired jobs', '''
+        UPDATE jobs SET status = ?, started_at = NULL
+        WHERE status = ? AND lease_until < ?
+    ''', ('queued', 'running', 0)),
+    ('store_report (created_at)', 'SELECT created_at FROM reports WHERE id = ?', (1,)),
+]
+
+
+def plan_problems(plan_details):
+    """Return the plan lines that mean a full table scan or an extra sort"""
+    problems = []
+    for detail in plan_details:
+        if detail.startswith('SCAN ') and ' USING ' not in detail:
+            problems.append(detail)
+        elif 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+def check_query_plans(db):
+    """Run EXPLAIN QUERY PLAN on every route query; return {name: problems}"""
+    # A private connection without a statement cache, so plans are always
+    # prepared against the current schema
+    conn = sqlite3.connect(db.path, cached_statements=0)
+    try:
+        failures = {}
+        for name, sql, params in ROUTE_QUERIES:
+            rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+            problems = plan_problems([row[3] for row in rows])
+            if problems:
+                failures[name] = problems
+        return failures
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    from db import Database
+    from main import DATABASE_PATH
+
+    parser = argparse.ArgumentParser(description='Backend schema migrations')
+    parser.add_argument('command', choices=['migrate', 'status', 'check-plans'])
+    parser.add_argument('--database', default=DATABASE_PATH)
+    args = parser.parse_args(argv)
+
+    db = Database(args.database)
+    if args.command == 'migrate':
+        print(f"Schema version: {migrate(db)}")
+        return 0
+
+    if args.command == 'status':
+        migrate_table = db.query_one(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'"
+        )
+        version = current_version(db) if migrate_table else 0
+        latest = MIGRATIONS[-1][0]
+        print(f"Schema version: {version} (latest {latest})")
+        return 0 if version == latest else 1
+
+    failures = check_query_plans(db)
+    for name, problems in failures.items():
+        for detail in problems:
+            print(f"FAIL {name}: {detail}")
+    if not failures:
+        print(f"OK: all {len(ROUTE_QUERIES)} route queries use an index")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
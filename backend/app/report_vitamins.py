@@ -0,0 +1,115 @@
+import json
+
+
+# =========================
+# Normalized report vitamins
+# =========================
+# One row per vitamin linked to a report, in the order Stage 3 ranked them.
+# foods/notes are the nutrition advice captured when the report was made;
+# they are NULL when the knowledge base had no advice for that vitamin, in
+# which case the vitamin appears in vitamin_deficiencies only.
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_vitamins (
+            report_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            vitamin TEXT NOT NULL,
+            association_strength REAL,
+            confidence_note TEXT,
+            source_type TEXT,
+            foods TEXT,
+            notes TEXT,
+            PRIMARY KEY (report_id, position),
+            FOREIGN KEY (report_id) REFERENCES reports (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_report_vitamins_vitamin
+        ON report_vitamins (vitamin, report_id)
+    ''')
+
+
+def insert(cursor, report_id, vitamins, recommendations):
+    """Write a report's vitamins; call inside the report insert transaction"""
+    advice = {rec['vitamin']: rec for rec in recommendations}
+    rows = []
+    for position, vit_info in enumerate(vitamins):
+        rec = advice.get(vit_info['vitamin'])
+        rows.append((
+            report_id, position, vit_info['vitamin'],
+            vit_info.get('association_strength'),
+            vit_info.get('confidence_note'),
+            vit_info.get('source_type'),
+            ';'.join(rec['foods']) if rec else None,
+            rec.get('notes') if rec else None
+        ))
+    cursor.executemany('''
+        INSERT INTO report_vitamins (report_id, position, vitamin, association_strength,
+                                     confidence_note, source_type, foods, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def _shape(rows):
+    """Rebuild the vitamin_deficiencies / nutrition_recommendations lists"""
+    deficiencies = []
+    recommendations = []
+    for vitamin, strength, note, source, foods, notes in rows:
+        deficiencies.append({
+            'vitamin': vitamin,
+            'association_strength': strength,
+            'confidence_note': note,
+            'source_type': source
+        })
+        if foods is not None:
+            recommendations.append({
+                'foods': foods.split(';') if foods else [],
+                'notes': notes,
+                'vitamin': vitamin,
+                'association_strength': strength,
+                'confidence_note': note,
+                'source_type': source
+            })
+    return deficiencies, recommendations
+
+
+def load_for_patient(db, patient_id):
+    """Return {report_id: (deficiencies, recommendations)} for a patient"""
+    rows = db.query('''
+        SELECT report_id, vitamin, association_strength, confidence_note,
+               source_type, foods, notes
+        FROM report_vitamins
+        WHERE report_id IN (SELECT id FROM reports WHERE patient_id = ?)
+        ORDER BY report_id, position
+    ''', (patient_id,))
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row[0], []).append(row[1:])
+    return {report_id: _shape(items) for report_id, items in grouped.items()}
+
+
+def convert_json_rows(cursor):
+    """Move legacy JSON blobs into report_vitamins and clear the blobs"""
+    rows = cursor.execute('''
+        SELECT id, vitamin_deficiencies, nutrition_recommendations FROM reports
+        WHERE vitamin_deficiencies IS NOT NULL OR nutrition_recommendations IS NOT NULL
+    ''').fetchall()
+
+    for report_id, vitamins_json, recommendations_json in rows:
+        vitamins = json.loads(vitamins_json) if vitamins_json else []
+        recommendations = json.loads(recommendations_json) if recommendations_json else []
+
+        # Advice for a vitamin missing from the deficiency list still has to
+        # survive the conversion, so append it as its own row
+        listed = {vit_info['vitamin'] for vit_info in vitamins}
+        vitamins = vitamins + [rec for rec in recommendations if rec['vitamin'] not in listed]
+
+        cursor.execute('DELETE FROM report_vitamins WHERE report_id = ?', (report_id,))
+        insert(cursor, report_id, vitamins, recommendations)
+
+    cursor.execute('''
+        UPDATE reports SET vitamin_deficiencies = NULL, nutrition_recommendations = NULL
+    ''')
+    return len(rows)
@@ -0,0 +1,130 @@
+import argparse
+import sys
+
+
+# =========================
+# Per-patient analytics rollups
+# =========================
+# Counters behind /api/analytics/<patient_id>. They are bumped in the same
+# transaction that inserts a report, so they are never ahead of or behind
+# the reports table.
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patient_vitamin_counts (
+            patient_id TEXT NOT NULL,
+            vitamin TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (patient_id, vitamin)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patient_disease_counts (
+            patient_id TEXT NOT NULL,
+            disease TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (patient_id, disease)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patient_monthly_counts (
+            patient_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (patient_id, month)
+        )
+    ''')
+
+
+def _bump(cursor, table, column, patient_id, key):
+    cursor.execute(f'''
+        INSERT INTO {table} (patient_id, {column}, count) VALUES (?, ?, 1)
+        ON CONFLICT (patient_id, {column}) DO UPDATE SET count = count + 1
+    ''', (patient_id, key))
+
+
+def record_report(cursor, patient_id, disease, recommendations, created_at):
+    """Add one stored report to the rollups; call inside its insert transaction"""
+    _bump(cursor, 'patient_disease_counts', 'disease', patient_id, disease or '')
+
+    for rec in recommendations:
+        vitamin = rec.get('vitamin', '')
+        if vitamin:
+            _bump(cursor, 'patient_vitamin_counts', 'vitamin', patient_id, vitamin)
+
+    if created_at:
+        _bump(cursor, 'patient_monthly_counts', 'month', patient_id, created_at[:7])
+
+
+def backfill(cursor):
+    """Rebuild every rollup from the reports tables; returns the report count"""
+    cursor.execute('DELETE FROM patient_vitamin_counts')
+    cursor.execute('DELETE FROM patient_disease_counts')
+    cursor.execute('DELETE FROM patient_monthly_counts')
+
+    cursor.execute('''
+        INSERT INTO patient_disease_counts (patient_id, disease, count)
+        SELECT patient_id, COALESCE(detected_disease, ''), COUNT(*)
+        FROM reports WHERE patient_id IS NOT NULL
+        GROUP BY patient_id, COALESCE(detected_disease, '')
+    ''')
+    cursor.execute('''
+        INSERT INTO patient_monthly_counts (patient_id, month, count)
+        SELECT patient_id, SUBSTR(created_at, 1, 7), COUNT(*)
+        FROM reports WHERE patient_id IS NOT NULL AND created_at IS NOT NULL
+        GROUP BY patient_id, SUBSTR(created_at, 1, 7)
+    ''')
+    # Only vitamins that came with nutrition advice count, as in the report view
+    cursor.execute('''
+        INSERT INTO patient_vitamin_counts (patient_id, vitamin, count)
+        SELECT r.patient_id, rv.vitamin, COUNT(*)
+        FROM report_vitamins rv JOIN reports r ON r.id = rv.report_id
+        WHERE r.patient_id IS NOT NULL AND rv.foods IS NOT NULL AND rv.vitamin != ''
+        GROUP BY r.patient_id, rv.vitamin
+    ''')
+
+    cursor.execute('SELECT COUNT(*) FROM reports')
+    return cursor.fetchone()[0]
+
+
+def patient_analytics(db, patient_id, top_vitamins=10):
+    """Read the chart data for one patient with three primary-key lookups"""
+    # A patient has at most a few dozen vitamins, so ranking them here is
+    # cheaper than maintaining an index on a counter that changes constantly
+    vitamins = db.query('''
+        SELECT vitamin, count FROM patient_vitamin_counts WHERE patient_id = ?
+    ''', (patient_id,))
+    vitamins = sorted(vitamins, key=lambda x: (-x[1], x[0]))[:top_vitamins]
+    diseases = db.query('''
+        SELECT disease, count FROM patient_disease_counts WHERE patient_id = ?
+    ''', (patient_id,))
+    monthly = db.query('''
+        SELECT month, count FROM patient_monthly_counts
+        WHERE patient_id = ? ORDER BY month
+    ''', (patient_id,))
+
+    return {
+        'vitamins': dict(vitamins),
+        'diseases': dict(diseases),
+        'monthly': dict(monthly)
+    }
+
+
+def main(argv=None):
+    from db import Database
+    from main import DATABASE_PATH
+
+    parser = argparse.ArgumentParser(description='Patient analytics rollups')
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--database', default=DATABASE_PATH)
+    args = parser.parse_args(argv)
+
+    db = Database(args.database)
+    with db.transaction() as cursor:
+        count = backfill(cursor)
+    print(f"Rebuilt rollups from {count} reports")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
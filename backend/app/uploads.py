@@ -0,0 +1,110 @@
+import contextvars
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Request
+
+from metrics import STAGE_SECONDS
+from observability import tracing
+
+
+UPLOAD_SPOOL_THRESHOLD = 1024 * 1024
+SAVE_CHUNK_SIZE = 256 * 1024
+
+# Persists uploads while the same buffer is being streamed to the AI service
+_saver = ThreadPoolExecutor(max_workers=4, thread_name_prefix='upload-saver')
+
+
+class UploadRequest(Request):
+    """Request that keeps uploads up to UPLOAD_SPOOL_THRESHOLD in memory.
+
+    Larger (or unknown-length) uploads are spooled to an anonymous temp file.
+    Either way the upload is buffered exactly once, by Werkzeug's parser.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        if total_content_length is not None and total_content_length <= UPLOAD_SPOOL_THRESHOLD:
+            return io.BytesIO()
+        return tempfile.TemporaryFile('wb+')
+
+
+class UploadBuffer:
+    """Read-only view over one buffered upload with independent readers.
+
+    In-memory uploads are exposed as a memoryview, on-disk ones through
+    ``os.pread`` on the file descriptor, so the AI-service stream and the
+    storage writer can read the same bytes concurrently without sharing a
+    file position and without copying the whole image.
+    """
+
+    def __init__(self, stream, owns_stream=False):
+        self._stream = stream
+        self._owns_stream = owns_stream
+        self._view = None
+        self._fd = None
+        self._save_future = None
+
+        if isinstance(stream, io.BytesIO):
+            self._view = stream.getbuffer()
+            self.size = len(self._view)
+        else:
+            stream.flush()
+            self._fd = stream.fileno()
+            self.size = os.fstat(self._fd).st_size
+
+    @classmethod
+    def from_path(cls, path):
+        return cls(open(path, 'rb'), owns_stream=True)
+
+    def read_at(self, offset, size):
+        end = min(offset + size, self.size)
+        if offset >= end:
+            return b''
+        if self._view is not None:
+            return self._view[offset:end]
+        return os.pread(self._fd, end - offset, offset)
+
+    def save(self, path):
+        with STAGE_SECONDS.labels('upload_save').time(), tracing.span('upload_save', bytes=self.size):
+            self._write(path)
+
+    def _write(self, path):
+        with open(path, 'wb') as f:
+            if self._view is not None:
+                f.write(self._view)
+                return
+            offset = 0
+            while offset < self.size:
+                chunk = self.read_at(offset, SAVE_CHUNK_SIZE)
+                f.write(chunk)
+                offset += len(chunk)
+
+    def save_async(self, path):
+        """Start persisting to ``path`` in the background"""
+        # Run in a copy of the caller's context so the save joins its trace
+        self._save_future = _saver.submit(contextvars.copy_context().run, self.save, path)
+        return self._save_future
+
+    def wait_saved(self):
+        """Block until a pending save_async finished; re-raises its error"""
+        if self._save_future is not None:
+            self._save_future.result()
+
+    def close(self):
+        # A background save may still be reading from the buffer
+        if self._save_future is not None:
+            self._save_future.exception()
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._owns_stream:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,321 @@
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+from PIL import Image
+
+from common import ROOT, environment, summarize, write_results
+
+
+# =========================
+# End-to-end backend load test
+# =========================
+# Starts the backend on a throw-away database and upload folder, pointed at
+# mock_ai_service.py, then drives a weighted mix of /api/analyze,
+# /api/reports and /api/analytics traffic from a pool of client threads.
+# Everything runs on localhost; nothing needs the network or the real models.
+#
+#   python benchmarks/loadtest.py --duration 60 --concurrency 16 \
+#       --mock-latency-ms 200 --mock-error-rate 0.02 --output results/loadtest.json
+#
+# Pass --backend-url to load an already running backend instead.
+
+BACKEND_DIR = os.path.join(ROOT, "backend", "app")
+DATA_DIR = os.path.join(ROOT, "data")
+
+# Run the backend without the debug reloader so one process serves everything
+BACKEND_BOOTSTRAP = """
+import sys
+import main
+main.init_database()
+main.job_queue.start()
+main.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def load_images(folder, count, size):
+    """JPEG bytes from ``folder``, or ``count`` synthetic images if none given"""
+    if folder:
+        images = []
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                with open(os.path.join(folder, name), "rb") as f:
+                    images.append(f.read())
+        if images:
+            return images
+        print(f"No images in {folder}, generating synthetic ones")
+    images = []
+    rng = random.Random(0)
+    for _ in range(count):
+        buf = io.BytesIO()
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        Image.new("RGB", (size, size), color).save(buf, "JPEG", quality=90)
+        images.append(buf.getvalue())
+    return images
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+# -------------------------
+# Traffic
+# -------------------------
+def call_analyze(session, base_url, patient_id, images, rng):
+    return session.post(
+        f"{base_url}/api/analyze",
+        data={"patient_id": patient_id},
+        files={"image": ("load.jpg", rng.choice(images), "image/jpeg")},
+        timeout=120
+    )
+
+
+def call_reports(session, base_url, patient_id, images, rng):
+    return session.get(f"{base_url}/api/reports/{patient_id}", timeout=30)
+
+
+def call_analytics(session, base_url, patient_id, images, rng):
+    return session.get(f"{base_url}/api/analytics/{patient_id}", timeout=30)
+
+
+ENDPOINTS = {"analyze": call_analyze, "reports": call_reports, "analytics": call_analytics}
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+
+    def record(self, endpoint, elapsed_ms, status, failed):
+        with self._lock:
+            self.latencies[endpoint].append(elapsed_ms)
+            self.statuses[endpoint][str(status)] += 1
+            if failed:
+                self.errors[endpoint] += 1
+
+
+def client(base_url, patients, images, mix, start_at, stop_at, recorder, seed):
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    session = requests.Session()
+    while time.monotonic() < stop_at:
+        endpoint = rng.choices(names, weights)[0]
+        patient_id = rng.choice(patients)
+        began = time.monotonic()
+        try:
+            response = ENDPOINTS[endpoint](session, base_url, patient_id, images, rng)
+            status, failed = response.status_code, response.status_code >= 500
+        except requests.RequestException as e:
+            status, failed = type(e).__name__, True
+        if began >= start_at:
+            recorder.record(endpoint, (time.monotonic() - began) * 1000, status, failed)
+
+
+def create_patients(base_url, count):
+    patients = []
+    for i in range(count):
+        response = requests.post(f"{base_url}/api/patients/create", json={
+            "name": f"Load Test {i}", "phone": "0000000000", "address": "benchmark"
+        }, timeout=30)
+        response.raise_for_status()
+        patients.append(response.json()["patient_id"])
+    return patients
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {baseline_path} ({baseline['environment'].get('revision')}):")
+    for endpoint, row in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        for key in ("throughput_rps", "p50_ms", "p99_ms"):
+            if before.get(key) and row.get(key) is not None:
+                change = (row[key] - before[key]) / before[key] * 100
+                print(f"  {endpoint:<10}{key:<16}{before[key]:>10.1f} -> {row[key]:>10.1f} ({change:+.1f}%)")
+
+
+# -------------------------
+# Processes under test
+# -------------------------
+def start_stack(args, workdir):
+    """Start the mock AI service and the backend; returns (backend_url, processes)"""
+    mock_port, backend_port = free_port(), free_port()
+    mock_log = open(os.path.join(workdir, "mock_ai_service.log"), "w")
+    backend_log = open(os.path.join(workdir, "backend.log"), "w")
+
+    mock = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "mock_ai_service.py"),
+        "--port", str(mock_port),
+        "--latency-ms", str(args.mock_latency_ms),
+        "--latency-sigma", str(args.mock_latency_sigma),
+        "--error-rate", str(args.mock_error_rate),
+        "--reject-rate", str(args.mock_reject_rate),
+        "--seed", str(args.seed)
+    ], stdout=mock_log, stderr=subprocess.STDOUT)
+    processes = [mock]
+    wait_until_up(f"http://127.0.0.1:{mock_port}/health")
+
+    for name in ("disease_vitamin_mapping.csv", "vitamin_nutrition.csv"):
+        shutil.copy(os.path.join(DATA_DIR, name), workdir)
+    env = dict(
+        os.environ,
+        PYTHONUNBUFFERED="1",
+        UPLOAD_FOLDER=os.path.join(workdir, "uploads"),
+        DATABASE_PATH=os.path.join(workdir, "database", "vitamin_system.db"),
+        DISEASE_VITAMIN_CSV=os.path.join(workdir, "disease_vitamin_mapping.csv"),
+        VITAMIN_NUTRITION_CSV=os.path.join(workdir, "vitamin_nutrition.csv"),
+        AI_SERVICE_URL=f"http://127.0.0.1:{mock_port}",
+        TRACE_PATH=os.path.join(workdir, "traces", "backend.jsonl")
+    )
+    os.makedirs(env["UPLOAD_FOLDER"])
+    os.makedirs(os.path.dirname(env["DATABASE_PATH"]))
+    backend = subprocess.Popen(
+        [sys.executable, "-c", BACKEND_BOOTSTRAP, str(backend_port)],
+        cwd=BACKEND_DIR, env=env, stdout=backend_log, stderr=subprocess.STDOUT
+    )
+    processes.append(backend)
+    backend_url = f"http://127.0.0.1:{backend_port}"
+    wait_until_up(f"{backend_url}/api/health")
+    return backend_url, mock_port, processes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the backend against a mock AI service")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before that")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads")
+    parser.add_argument("--mix", default="analyze=2,reports=3,analytics=2", help="Endpoint weights")
+    parser.add_argument("--patients", type=int, default=50)
+    parser.add_argument("--images", help="Folder of sample JPEG/PNG images")
+    parser.add_argument("--synthetic-images", type=int, default=8)
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--mock-latency-ms", type=float, default=150.0)
+    parser.add_argument("--mock-latency-sigma", type=float, default=0.5)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-reject-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend-url", help="Use a running backend instead of starting one")
+    parser.add_argument("--output", default="benchmarks/results/loadtest.json")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the temp DB, uploads and logs")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    images = load_images(args.images, args.synthetic_images, args.image_size)
+    workdir = tempfile.mkdtemp(prefix="vitamin-loadtest-")
+    processes = []
+    mock_port = None
+    try:
+        if args.backend_url:
+            base_url = args.backend_url.rstrip("/")
+        else:
+            base_url, mock_port, processes = start_stack(args, workdir)
+            print(f"Backend at {base_url}, mock AI service on port {mock_port}, logs in {workdir}")
+
+        patients = create_patients(base_url, args.patients)
+        recorder = Recorder()
+        start_at = time.monotonic() + args.warmup
+        stop_at = start_at + args.duration
+        threads = [
+            threading.Thread(
+                target=client,
+                args=(base_url, patients, images, mix, start_at, stop_at, recorder, args.seed + i),
+                daemon=True
+            )
+            for i in range(args.concurrency)
+        ]
+        print(f"Running {args.concurrency} clients for {args.warmup:.0f}s warm-up + {args.duration:.0f}s")
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        endpoints = {}
+        for endpoint in mix:
+            latencies = recorder.latencies.get(endpoint, [])
+            endpoints[endpoint] = dict(
+                summarize(latencies),
+                throughput_rps=len(latencies) / args.duration,
+                errors=recorder.errors[endpoint],
+                statuses=dict(recorder.statuses[endpoint])
+            )
+        all_latencies = [latency for values in recorder.latencies.values() for latency in values]
+        results = {
+            "environment": environment(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+            "endpoints": endpoints,
+            "total": dict(summarize(all_latencies), throughput_rps=len(all_latencies) / args.duration,
+                          errors=sum(recorder.errors.values())),
+            "backend_health": requests.get(f"{base_url}/api/health", timeout=10).json()
+        }
+        if mock_port:
+            results["mock_ai_service"] = requests.get(f"http://127.0.0.1:{mock_port}/health", timeout=10).json()
+
+        print(f"\n{'endpoint':<12}{'count':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for endpoint, row in list(endpoints.items()) + [("total", results["total"])]:
+            if not row["count"]:
+                print(f"{endpoint:<12}{0:>8}")
+                continue
+            print(
+                f"{endpoint:<12}{row['count']:>8}{row['throughput_rps']:>9.1f}{row['p50_ms']:>10.1f}"
+                f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['errors']:>8}"
+            )
+        ai_stats = results["backend_health"].get("ai_service", {})
+        print(f"AI client: {json.dumps(ai_stats.get('stages', {}).get('analyze', {}))}")
+
+        write_results(args.output, results)
+        if args.baseline:
+            compare(results, args.baseline)
+        return 0
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import argparse
+import random
+import threading
+import time
+
+from flask import Flask, jsonify, request
+
+
+# =========================
+# Stand-in AI service
+# =========================
+# Serves /validate, /detect, /analyze and /health with the same JSON shapes
+# as ai_service/main.py, but answers after a sampled delay instead of running
+# any model. Latency is log-normal around --latency-ms; a share of requests
+# fail with --error-status or are rejected as non-medical.
+#
+#   python benchmarks/mock_ai_service.py --port 5101 --latency-ms 150 --error-rate 0.02
+
+DISEASES = [
+    'dermatitis', 'eczema', 'psoriasis', 'acne',
+    'rosacea', 'vitiligo', 'melanoma',
+    'scurvy', 'pellagra', 'beriberi', 'rickets'
+]
+
+
+def create_app(latency_ms=100.0, latency_sigma=0.5, error_rate=0.0, error_status=503,
+               reject_rate=0.0, seed=None):
+    app = Flask(__name__)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    counters = {"requests": 0, "errors": 0, "rejected": 0}
+
+    def sample():
+        with rng_lock:
+            delay = rng.lognormvariate(0, latency_sigma) * latency_ms / 1000 if latency_ms > 0 else 0.0
+            return delay, rng.random() < error_rate, rng.random() < reject_rate, rng.choice(DISEASES), rng.uniform(0.6, 0.95)
+
+    def handle(stage):
+        # Drain the upload like the real service would
+        image = request.files.get("image")
+        if image is None:
+            return jsonify({"error": "No image provided"}), 400
+        image.read()
+
+        delay, fail, reject, disease, confidence = sample()
+        time.sleep(delay)
+        valid = not reject or stage == "detect"
+        with rng_lock:
+            counters["requests"] += 1
+            counters["errors"] += fail
+            counters["rejected"] += not fail and not valid
+        if fail:
+            return jsonify({"error": "injected failure"}), error_status
+
+        validation = {
+            "valid": valid,
+            "caption": "a close up of a person's hand" if valid else "a red car on the road",
+            "reason": "Biological content verified: hand" if valid else "Non-medical content detected: car"
+        }
+        detection = {"disease": disease, "confidence": round(confidence, 4)}
+
+        if stage == "validate":
+            return jsonify(dict(validation, message="mock"))
+        if stage == "detect":
+            return jsonify(dict(detection, success=True, message="mock"))
+        result = dict(validation, validated=True, stage2_skipped=not valid)
+        if valid:
+            result.update(detection)
+        return jsonify(result)
+
+    app.add_url_rule("/validate", "validate", lambda: handle("validate"), methods=["POST"])
+    app.add_url_rule("/detect", "detect", lambda: handle("detect"), methods=["POST"])
+    app.add_url_rule("/analyze", "analyze", lambda: handle("analyze"), methods=["POST"])
+
+    @app.route("/health", methods=["GET"])
+    def health():
+        return jsonify({"status": "healthy", "mock": True, **counters})
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock AI service for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5101)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Median response delay")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread; 0 = fixed delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="Share of images rejected as non-medical")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    app = create_app(
+        args.latency_ms, args.latency_sigma, args.error_rate,
+        args.error_status, args.reject_rate, args.seed
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from common import ROOT, environment, percentile, write_results
+
+
+# =========================
+# Stage-3 microbenchmark
+# =========================
+# Generates synthetic disease->vitamin mapping and nutrition CSVs of several
+# sizes, loads them into the backend's KnowledgeBase and times the real
+# Stage-3 functions from backend/app/main.py:
+#
+#   load       parse + index + sort both CSVs (KnowledgeBase snapshot build)
+#   lookup     infer_vitamin_deficiencies(disease)
+#   assemble   get_nutrition_recommendations(vitamins)
+#   pipeline   lookup + assemble, as /api/analyze runs them
+#
+# Each operation is measured for repeated single-thread calls and for
+# concurrent calls from --threads threads, with time and memory per call.
+#
+#   python benchmarks/stage3_bench.py --sizes 120,10000,50000 --output results/stage3.json
+#   python benchmarks/stage3_bench.py --baseline results/stage3.json   # flags regressions
+
+BACKEND_DIR = os.path.join(ROOT, "backend", "app")
+STRENGTHS = ("high", "medium", "low")
+SOURCES = ("medical_textbook", "clinical_study", "review_article", "case_report")
+
+
+def generate_knowledge_base(directory, rows, vitamins_per_disease, seed):
+    """Write mapping/nutrition CSVs with ``rows`` mapping rows.
+
+    Disease fan-out is skewed: most diseases have a few vitamins and a small
+    share have many, like the real table. Returns the disease names.
+    """
+    rng = random.Random(seed)
+    vitamin_count = max(16, rows // 50)
+    vitamins = [f"Vitamin {i:05d}" for i in range(vitamin_count)]
+    diseases = []
+
+    mapping_path = os.path.join(directory, "disease_vitamin_mapping.csv")
+    with open(mapping_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["disease_name", "vitamin", "association_strength", "confidence_note", "source_type"])
+        written = 0
+        while written < rows:
+            disease = f"synthetic_disease_{len(diseases):06d}"
+            diseases.append(disease)
+            fan_out = min(rows - written, max(1, int(rng.paretovariate(1.5) * vitamins_per_disease / 3)))
+            for _ in range(fan_out):
+                writer.writerow([
+                    disease, rng.choice(vitamins), rng.choice(STRENGTHS),
+                    "Synthetic association for benchmarking", rng.choice(SOURCES)
+                ])
+            written += fan_out
+
+    nutrition_path = os.path.join(directory, "vitamin_nutrition.csv")
+    with open(nutrition_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["vitamin", "foods", "notes"])
+        for vitamin in vitamins:
+            foods = ";".join(f"Food {rng.randint(0, 9999)}" for _ in range(rng.randint(3, 10)))
+            writer.writerow([vitamin, foods, "Synthetic nutrition notes for benchmarking"])
+
+    return mapping_path, nutrition_path, diseases
+
+
+def time_calls(fn, args_list):
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter_ns()
+        fn(*args)
+        latencies.append((time.perf_counter_ns() - start) / 1000)
+    return latencies
+
+
+def memory_per_call(fn, args_list):
+    """Peak traced bytes of one call and bytes still held by its result"""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for args in args_list:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            result = fn(*args)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+            del result
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks), sum(retained) / len(retained)
+
+
+def run_concurrent(fn, args_list, threads):
+    per_thread = [args_list[i::threads] for i in range(threads)]
+    latencies = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        barrier.wait()
+        latencies[index] = time_calls(fn, per_thread[index])
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    merged = [latency for values in latencies for latency in values]
+    return merged, len(args_list) / elapsed
+
+
+def measure(name, fn, args_list, threads, memory_samples):
+    fn(*args_list[0])
+    latencies = time_calls(fn, args_list)
+    concurrent, concurrent_rate = run_concurrent(fn, args_list, threads)
+    peak_bytes, retained_bytes = memory_per_call(fn, args_list[:memory_samples])
+    return {
+        "operation": name,
+        "calls": len(args_list),
+        "mean_us": sum(latencies) / len(latencies),
+        "p50_us": percentile(latencies, 50),
+        "p99_us": percentile(latencies, 99),
+        "calls_per_second": 1e6 / (sum(latencies) / len(latencies)),
+        "concurrent_threads": threads,
+        "concurrent_p99_us": percentile(concurrent, 99),
+        "concurrent_calls_per_second": concurrent_rate,
+        "peak_bytes_per_call": peak_bytes,
+        "retained_bytes_per_call": retained_bytes
+    }
+
+
+def bench_size(main, rows, args, workdir):
+    directory = os.path.join(workdir, str(rows))
+    os.makedirs(directory)
+    mapping_path, nutrition_path, diseases = generate_knowledge_base(
+        directory, rows, args.vitamins_per_disease, args.seed
+    )
+
+    rng = random.Random(args.seed)
+    # Mostly known diseases, some misses, as real detector output would be
+    queries = [
+        (rng.choice(diseases) if rng.random() >= args.miss_rate else f"unknown_{i}",)
+        for i in range(args.calls)
+    ]
+
+    load_times = []
+    for _ in range(args.load_repeats):
+        kb = main.KnowledgeBase(mapping_path, nutrition_path)
+        start = time.perf_counter()
+        kb.snapshot()
+        load_times.append((time.perf_counter() - start) * 1000)
+    main.knowledge_base = kb
+
+    vitamin_lists = [(main.infer_vitamin_deficiencies(q[0]),) for q in queries]
+    results = [
+        measure("lookup", main.infer_vitamin_deficiencies, queries, args.threads, args.memory_samples),
+        measure("assemble", main.get_nutrition_recommendations, vitamin_lists, args.threads, args.memory_samples),
+        measure(
+            "pipeline",
+            lambda disease: main.get_nutrition_recommendations(main.infer_vitamin_deficiencies(disease)),
+            queries, args.threads, args.memory_samples
+        )
+    ]
+
+    fan_out = [len(v[0]) for v in vitamin_lists]
+    return {
+        "rows": rows,
+        "diseases": len(diseases),
+        "mean_vitamins_per_lookup": sum(fan_out) / len(fan_out),
+        "max_vitamins_per_lookup": max(fan_out),
+        "load_ms": min(load_times),
+        "operations": results
+    }
+
+
+# -------------------------
+# Regression check
+# -------------------------
+REGRESSION_METRICS = ("mean_us", "p99_us", "concurrent_p99_us", "peak_bytes_per_call")
+
+
+def find_regressions(results, baseline, threshold):
+    """Compare against an earlier run; returns human-readable findings"""
+    findings = []
+    before_sizes = {size["rows"]: size for size in baseline.get("sizes", [])}
+    for size in results["sizes"]:
+        before = before_sizes.get(size["rows"])
+        if before is None:
+            continue
+        pairs = [("load", "load_ms", size["load_ms"], before["load_ms"])]
+        before_ops = {op["operation"]: op for op in before["operations"]}
+        for op in size["operations"]:
+            if op["operation"] in before_ops:
+                for metric in REGRESSION_METRICS:
+                    pairs.append((op["operation"], metric, op[metric], before_ops[op["operation"]][metric]))
+        for operation, metric, now, then in pairs:
+            if then and now > then * (1 + threshold):
+                findings.append(
+                    f"{size['rows']} rows {operation} {metric}: {then:.1f} -> {now:.1f} "
+                    f"(+{(now - then) / then * 100:.0f}%)"
+                )
+    return findings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Stage-3 vitamin inference on synthetic knowledge bases")
+    parser.add_argument("--sizes", default="120,1000,10000,50000", help="Mapping rows per knowledge base")
+    parser.add_argument("--vitamins-per-disease", type=float, default=3.0)
+    parser.add_argument("--calls", type=int, default=5000, help="Calls per operation")
+    parser.add_argument("--threads", type=int, default=8, help="Threads for the concurrent run")
+    parser.add_argument("--memory-samples", type=int, default=500, help="Calls traced for memory")
+    parser.add_argument("--load-repeats", type=int, default=3)
+    parser.add_argument("--miss-rate", type=float, default=0.05, help="Share of lookups for unknown diseases")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="benchmarks/results/stage3.json")
+    parser.add_argument("--baseline", help="Earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="vitamin-stage3-")
+    # The backend module opens nothing at import, but keep it off /app anyway
+    os.environ.setdefault("DATABASE_PATH", os.path.join(workdir, "unused.db"))
+    os.environ.setdefault("UPLOAD_FOLDER", workdir)
+    # Time Stage 3 at the production log level, without a line per snapshot load
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, BACKEND_DIR)
+    import main as backend
+
+    try:
+        sizes = []
+        print(f"{'rows':>8}{'operation':>11}{'mean us':>10}{'p99 us':>10}{'conc p99':>10}{'calls/s':>11}{'peak B':>9}")
+        for rows in [int(v) for v in args.sizes.split(",")]:
+            size = bench_size(backend, rows, args, workdir)
+            sizes.append(size)
+            # Not a per-call time, so not in the mean us column
+            print(f"{rows:>8}{'load':>11}  knowledge base loaded in {size['load_ms']:.1f} ms")
+            for op in size["operations"]:
+                print(
+                    f"{rows:>8}{op['operation']:>11}{op['mean_us']:>10.1f}{op['p99_us']:>10.1f}"
+                    f"{op['concurrent_p99_us']:>10.1f}{op['calls_per_second']:>11.0f}{op['peak_bytes_per_call']:>9.0f}"
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "environment": environment(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "sizes": sizes
+    }
+    findings = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            findings = find_regressions(results, json.load(f), args.threshold)
+        results["regressions"] = findings
+    write_results(args.output, results)
+
+    if findings:
+        print(f"\n{len(findings)} regression(s) over {args.threshold:.0%} against {args.baseline}:")
+        for finding in findings:
+            print(f"  {finding}")
+        return 1
+    if args.baseline:
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
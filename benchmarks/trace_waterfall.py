@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+
+from common import ROOT
+
+
+# =========================
+# Trace waterfall
+# =========================
+# Reads the span JSONL files written by the backend and the AI service,
+# joins them on the trace ID (the X-Request-ID header) and prints the
+# slowest traces as an indented waterfall:
+#
+#   python benchmarks/trace_waterfall.py --top 5 --route /api/analyze
+#   python benchmarks/trace_waterfall.py --trace 3f9c0e...   # one request
+#
+# Offsets are relative to the first span of each trace; spans from the two
+# services are placed on one timeline using their wall-clock start times.
+
+DEFAULT_FILES = [
+    os.path.join(ROOT, "data", "traces", "backend.jsonl"),
+    os.path.join(ROOT, "models", "traces", "ai_service.jsonl")
+]
+
+
+def load_traces(paths):
+    traces = defaultdict(list)
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Skipping {path}: not found", file=sys.stderr)
+            continue
+        with open(path) as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    # A process killed mid-write can leave a partial last line
+                    continue
+                traces[span["trace_id"]].append(span)
+    return traces
+
+
+def trace_bounds(spans):
+    start = min(span["start"] for span in spans)
+    end = max(span["start"] + span["duration_ms"] / 1000 for span in spans)
+    return start, (end - start) * 1000
+
+
+def root_name(spans):
+    ids = {span["span_id"] for span in spans}
+    roots = [span for span in spans if span.get("parent_id") not in ids]
+    return min(roots, key=lambda span: span["start"])["name"] if roots else "?"
+
+
+def print_waterfall(trace_id, spans, width):
+    start, total_ms = trace_bounds(spans)
+    ids = {span["span_id"] for span in spans}
+    children = defaultdict(list)
+    for span in spans:
+        parent = span.get("parent_id")
+        children[parent if parent in ids else None].append(span)
+
+    print(f"\ntrace {trace_id}  {total_ms:.1f} ms  {len(spans)} spans")
+    scale = width / total_ms if total_ms else 0
+
+    def walk(parent, depth):
+        for span in sorted(children.get(parent, []), key=lambda s: s["start"]):
+            offset_ms = (span["start"] - start) * 1000
+            lead = int(offset_ms * scale)
+            bar = max(1, int(span["duration_ms"] * scale))
+            label = f"{'  ' * depth}{span['name']} [{span['service']}]"
+            if span.get("error"):
+                label += " !"
+            print(f"  {label:<44}{offset_ms:>9.1f}{span['duration_ms']:>10.1f}  |{' ' * lead}{'#' * bar}")
+            walk(span["span_id"], depth + 1)
+
+    print(f"  {'span':<44}{'at ms':>9}{'ms':>10}")
+    walk(None, 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the slowest request traces as waterfalls")
+    parser.add_argument("files", nargs="*", help="Span JSONL files (default: both services' trace files)")
+    parser.add_argument("--top", type=int, default=5, help="Number of slowest traces to show")
+    parser.add_argument("--route", help="Only traces whose root span name contains this")
+    parser.add_argument("--trace", help="Show this trace ID only")
+    parser.add_argument("--width", type=int, default=50, help="Bar width in characters")
+    args = parser.parse_args(argv)
+
+    traces = load_traces(args.files or DEFAULT_FILES)
+    if args.trace:
+        if args.trace not in traces:
+            print(f"Trace {args.trace} not found")
+            return 1
+        print_waterfall(args.trace, traces[args.trace], args.width)
+        return 0
+
+    candidates = [
+        (trace_bounds(spans)[1], trace_id) for trace_id, spans in traces.items()
+        if not args.route or args.route in root_name(traces[trace_id])
+    ]
+    if not candidates:
+        print("No matching traces")
+        return 1
+
+    candidates.sort(reverse=True)
+    print(f"{len(candidates)} traces; slowest {min(args.top, len(candidates))}:")
+    for _, trace_id in candidates[:args.top]:
+        print_waterfall(trace_id, traces[trace_id], args.width)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
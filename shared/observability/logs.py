@@ -0,0 +1,177 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from observability import tracing
+
+
+# Request threads only put records on a queue; formatting and the write to
+# stdout happen on a listener thread. Records below LOG_LEVEL are discarded
+# by the logger before a record is even built.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+# Per-logger overrides, e.g. "stage3=DEBUG,jobs=WARNING"
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+# Keep 1 in N of the records logged with extra=SAMPLED (per-row or per-item debug lines)
+LOG_SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", "100"))
+LOG_QUEUE_SIZE = 10000
+
+SAMPLED = {"sampled": True}
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class _ContextFilter(logging.Filter):
+    """Runs in the caller's thread: stamps the service and current trace ID"""
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def filter(self, record):
+        record.service = self.service
+        record.trace_id = tracing.current_trace_id()
+        return True
+
+
+class _SamplingFilter(logging.Filter):
+    """Lets through every Nth record of each sampled message"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, every)
+        self._counters = defaultdict(itertools.count)
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False):
+            return True
+        record.sample_every = self.every
+        return next(self._counters[(record.name, record.msg)]) % self.every == 0
+
+
+class AsyncQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler formats each record in the calling thread before
+    queueing it; here the record is queued as is, and dropped (counted in
+    ``dropped``) rather than blocking when the queue is full. Arguments are
+    formatted later, so pass values rather than objects mutated afterwards.
+    The listener is restarted in a forked child, whose copy has no thread.
+    """
+
+    def __init__(self, handlers, maxsize=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = handlers
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._listener is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._listener is None or self._pid != os.getpid():
+                self.queue = queue.Queue(self.maxsize)
+                self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out everything queued so far; used at exit"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(name)s] %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        if getattr(record, "trace_id", None):
+            line += f" trace={record.trace_id}"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra`` fields are included as keys"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_levels(text):
+    levels = {}
+    for part in text.split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_handler = None
+
+
+def configure(service, level=LOG_LEVEL, fmt=LOG_FORMAT, sample_every=LOG_SAMPLE_EVERY, levels=LOG_LEVELS):
+    """Route the root logger through one AsyncQueueHandler writing to stdout"""
+    global _handler
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = AsyncQueueHandler([stream])
+    handler.addFilter(_SamplingFilter(sample_every))
+    handler.addFilter(_ContextFilter(service))
+
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+        _handler.stop()
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name, logger_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    if _handler is None:
+        atexit.register(lambda: _handler.stop())
+    _handler = handler
+    return handler
+
+
+def stats():
+    if _handler is None:
+        return {"configured": False}
+    return {"configured": True, "level": logging.getLevelName(logging.getLogger().level), "dropped": _handler.dropped}
@@ -0,0 +1,71 @@
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
+
+
+# =========================
+# Prometheus exposition
+# =========================
+# Each service defines its own metrics in its own CollectorRegistry; this
+# module serves them and records the per-request series. When
+# PROMETHEUS_MULTIPROC_DIR is set (gunicorn, see ai_service/gunicorn.conf.py)
+# prometheus_client keeps every worker's values in files in that directory
+# and a scrape of any worker adds them all up.
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+
+def multiprocess_mode():
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render(registry):
+    """Exposition text for ``registry``, summed over workers in multiprocess mode"""
+    if multiprocess_mode():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges; called from gunicorn's child_exit"""
+    if multiprocess_mode():
+        multiprocess.mark_process_dead(pid)
+
+
+def instrument(app, request_seconds, in_flight):
+    """Record route latency and in-flight requests for every Flask request.
+
+    ``request_seconds`` is a histogram labelled (method, route, status) and
+    ``in_flight`` a gauge labelled (route). Routes are the URL rule, so path
+    parameters never become label values.
+    """
+    from flask import g, request
+
+    def route_label():
+        return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_in_flight = in_flight.labels(route_label())
+        g.metrics_in_flight.inc()
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            request_seconds.labels(request.method, route_label(), response.status_code).observe(
+                time.perf_counter() - start
+            )
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        gauge = g.pop("metrics_in_flight", None)
+        if gauge is not None:
+            gauge.dec()
@@ -0,0 +1,251 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+
+# The backend creates the ID at its edge (or keeps a valid one from the
+# caller) and forwards both headers on every AI-service call, so the AI
+# service's spans join the same trace under the backend span that called it.
+# Each service names itself with configure(); spans from all services share
+# one record format, which benchmarks/trace_waterfall.py joins.
+TRACE_HEADER = "X-Request-ID"
+PARENT_HEADER = "X-Parent-Span-ID"
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+log = logging.getLogger("trace")
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_writer = None
+_service = None
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+class Span:
+    """One timed operation; written as a JSON line when it ends"""
+
+    def __init__(self, name, trace_id, parent_id=None, attrs=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = attrs or {}
+        self._parent = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._parent = _current.get()
+        _current.set(self)
+        self.start = time.time()
+        self._began = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._began) * 1000
+        _current.set(self._parent)
+        error = f"{exc_type.__name__}: {exc}" if exc_type is not None else None
+        _emit(self.trace_id, self.span_id, self.parent_id, self.name, self.start, duration_ms, self.attrs, error)
+        return False
+
+
+def _emit(trace_id, span_id, parent_id, name, start, duration_ms, attrs, error=None):
+    if _writer is None:
+        return
+    record = {
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_id": parent_id,
+        "service": _service,
+        "name": name,
+        "start": start,
+        "duration_ms": round(duration_ms, 3)
+    }
+    if error is not None:
+        record["error"] = error
+    if attrs:
+        record["attrs"] = attrs
+    _writer.write(record)
+
+
+def record_span(parent, name, start, duration_ms, **attrs):
+    """Write an already finished span under ``parent``.
+
+    For work done on another thread on behalf of several traces at once,
+    such as one micro-batch serving requests from different callers.
+    """
+    if parent is not None:
+        _emit(parent.trace_id, new_id()[:16], parent.span_id, name, start, duration_ms, attrs)
+
+
+class _NullSpan:
+    """Stand-in used outside a trace, so span() costs next to nothing"""
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def start_trace(name, trace_id=None, parent_id=None, **attrs):
+    """Root span of a trace; a fresh ID is used unless a valid one is given"""
+    if not trace_id or not _VALID_ID.match(trace_id):
+        trace_id = new_id()
+    if parent_id and not _VALID_ID.match(parent_id):
+        parent_id = None
+    return Span(name, trace_id, parent_id, attrs)
+
+
+def span(name, **attrs):
+    """Child of the current span, or a no-op when no trace is active"""
+    parent = _current.get()
+    if parent is None:
+        return NULL_SPAN
+    return Span(name, parent.trace_id, parent.span_id, attrs)
+
+
+def current_span():
+    return _current.get()
+
+
+def current_trace_id():
+    current = _current.get()
+    return current.trace_id if current is not None else None
+
+
+def outgoing_headers():
+    """Headers that make a downstream service join the current trace"""
+    current = _current.get()
+    if current is None:
+        return {}
+    return {TRACE_HEADER: current.trace_id, PARENT_HEADER: current.span_id}
+
+
+class TraceWriter:
+    """Appends span records to a JSONL file from a background thread.
+
+    ``write`` never blocks a request: records go onto a bounded queue and
+    are dropped (and counted) when it is full. The writer thread drains the
+    queue in batches and appends each batch with a single ``os.write`` on an
+    O_APPEND descriptor, so several processes can share one file.
+    """
+
+    def __init__(self, path, max_queue=10000, batch_size=256):
+        self.path = path
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so a child process starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, record):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        except OSError as e:
+            # Keep draining so callers never block; everything counts as dropped
+            log.error("Cannot open %s: %s", self.path, e)
+            fd = None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            data = "".join(json.dumps(r, separators=(",", ":"), default=str) + "\n" for r in batch)
+            try:
+                if fd is None:
+                    raise OSError("trace file is not open")
+                os.write(fd, data.encode("utf-8"))
+            except OSError as e:
+                self.dropped += len(batch)
+                log.error("Write failed: %s", e)
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout=2.0):
+        """Wait (bounded) until every queued record has been written"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def configure(service, path):
+    """Send spans to ``path``; an empty path keeps IDs but writes nothing"""
+    global _writer, _service
+    _service = service
+    _writer = TraceWriter(path) if path else None
+    if _writer is not None:
+        atexit.register(_writer.flush)
+
+
+def stats():
+    if _writer is None:
+        return {"enabled": False}
+    return {"enabled": True, "path": _writer.path, "dropped": _writer.dropped}
+
+
+def instrument(app):
+    """Open a root span per Flask request and echo its ID in the response"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        root = start_trace(
+            f"{request.method} {route}",
+            request.headers.get(TRACE_HEADER), request.headers.get(PARENT_HEADER)
+        )
+        g.trace_span = root.__enter__()
+
+    @app.after_request
+    def _tag(response):
+        root = g.get("trace_span")
+        if root is not None:
+            root.set(status=response.status_code)
+            response.headers[TRACE_HEADER] = root.trace_id
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        root = g.pop("trace_span", None)
+        if root is not None:
+            root.__exit__(type(exc) if exc is not None else None, exc, None)
@@ -0,0 +1,13 @@
+import os
+import sys
+
+
+# The AI service is a directory of top-level modules run from inside it, and
+# some of their names (metrics, main) are also used by the backend. Put it
+# first on the path and drop any backend module of the same name that an
+# earlier test directory imported.
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ai_service")
+
+sys.path.insert(0, os.path.normpath(SERVICE_DIR))
+for name in ("main", "metrics"):
+    sys.modules.pop(name, None)
@@ -0,0 +1,99 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def submit_all(batcher, items, timeout=5):
+    """Submit every item from its own thread, so they can share batches"""
+    with ThreadPoolExecutor(len(items)) as pool:
+        futures = [pool.submit(batcher.submit, item, timeout) for item in items]
+    return futures
+
+
+def test_results_go_back_to_their_callers_in_order():
+    batches = []
+
+    def double(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait_ms=50)
+    futures = submit_all(batcher, list(range(8)))
+
+    assert [f.result() for f in futures] == [item * 2 for item in range(8)]
+    assert sum(len(batch) for batch in batches) == 8
+    assert max(len(batch) for batch in batches) <= 4
+
+
+def test_batch_size_and_wait_bound_each_batch():
+    sizes = []
+    batcher = MicroBatcher(lambda items: sizes.append(len(items)) or list(items), max_batch_size=3, max_wait_ms=200)
+    submit_all(batcher, list(range(7)))
+
+    assert sum(sizes) == 7
+    assert all(size <= 3 for size in sizes)
+    assert batcher.stats()["items"] == 7
+
+
+def test_exception_fans_out_to_every_caller_in_the_batch():
+    def fail(items):
+        raise ValueError("model exploded")
+
+    batcher = MicroBatcher(fail, max_batch_size=4, max_wait_ms=50)
+    futures = submit_all(batcher, [1, 2, 3])
+
+    for future in futures:
+        with pytest.raises(ValueError, match="model exploded"):
+            future.result()
+
+
+def test_wrong_number_of_results_fails_the_whole_batch():
+    batcher = MicroBatcher(lambda items: list(items)[:-1], max_batch_size=4, max_wait_ms=100)
+    futures = submit_all(batcher, [1, 2, 3])
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="results for"):
+            future.result()
+
+
+def test_batcher_keeps_serving_after_a_failed_batch():
+    calls = []
+
+    def flaky(items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise RuntimeError("first batch fails")
+        return list(items)
+
+    batcher = MicroBatcher(flaky, max_batch_size=1, max_wait_ms=0)
+    with pytest.raises(RuntimeError):
+        batcher.submit("a", 5)
+    assert batcher.submit("b", 5) == "b"
+
+
+def test_timed_out_item_is_dropped_before_it_runs():
+    seen = []
+    release = threading.Event()
+
+    def slow(items):
+        seen.extend(items)
+        release.wait(5)
+        return list(items)
+
+    batcher = MicroBatcher(slow, max_batch_size=1, max_wait_ms=0)
+    first = threading.Thread(target=batcher.submit, args=("first", 5))
+    first.start()
+    while not seen:
+        time.sleep(0.01)
+
+    with pytest.raises(TimeoutError):
+        batcher.submit("late", 0.05)
+    release.set()
+    first.join()
+
+    assert batcher.submit("next", 5) == "next"
+    assert seen == ["first", "next"]
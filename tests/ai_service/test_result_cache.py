@@ -0,0 +1,107 @@
+import sqlite3
+import threading
+
+from result_cache import ResultCache
+
+
+def test_key_depends_on_image_and_model_version():
+    key = ResultCache.make_key(b"image", "detect:v1")
+    assert key == ResultCache.key_for_digest(ResultCache.digest(b"image"), "detect:v1")
+    assert key != ResultCache.make_key(b"image", "detect:v2")
+    assert key != ResultCache.make_key(b"other", "detect:v1")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}  # a is now the most recent
+    cache.put("c", {"v": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_returned_values_are_copies():
+    cache = ResultCache()
+    value = {"valid": True}
+    cache.put("k", value)
+    value["valid"] = False
+    cache.get("k")["valid"] = False
+
+    assert cache.get("k") == {"valid": True}
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("result_cache.time.time", lambda: now[0])
+    cache = ResultCache(ttl_seconds=60)
+    cache.put("k", {"v": 1})
+
+    now[0] += 30
+    assert cache.get("k") == {"v": 1}
+    now[0] += 31
+    assert cache.get("k") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["misses"] == 1
+
+
+def test_sqlite_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache" / "inference.db")
+    ResultCache(db_path=path).put("k", {"disease": "eczema"})
+
+    restarted = ResultCache(db_path=path)
+    assert restarted.get("k") == {"disease": "eczema"}
+    assert restarted.get("k") == {"disease": "eczema"}
+    stats = restarted.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+
+
+def test_sqlite_tier_backs_evicted_entries(tmp_path):
+    cache = ResultCache(max_entries=1, db_path=str(tmp_path / "inference.db"))
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_expired_disk_entries_are_deleted(tmp_path, monkeypatch):
+    path = str(tmp_path / "inference.db")
+    now = [1000.0]
+    monkeypatch.setattr("result_cache.time.time", lambda: now[0])
+    ResultCache(ttl_seconds=60, db_path=path).put("k", {"v": 1})
+
+    now[0] += 61
+    assert ResultCache(ttl_seconds=60, db_path=path).get("k") is None
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM inference_cache").fetchone()[0] == 0
+
+
+def test_disk_errors_fall_back_to_memory(tmp_path):
+    cache = ResultCache(db_path=str(tmp_path / "inference.db"))
+    cache.put("k", {"v": 1})
+    cache._connection().execute("DROP TABLE inference_cache")
+
+    cache.put("other", {"v": 2})
+    assert cache.get("k") == {"v": 1}
+    assert cache.get("missing") is None
+
+
+def test_memory_hits_do_not_wait_for_the_disk_tier(tmp_path):
+    cache = ResultCache(db_path=str(tmp_path / "inference.db"))
+    cache.put("k", {"v": 1})
+    results = []
+
+    # Stand in for another thread's slow SQLite read or commit
+    with cache._db_lock:
+        reader = threading.Thread(target=lambda: results.append(cache.get("k")))
+        reader.start()
+        reader.join(timeout=2)
+        assert not reader.is_alive()
+
+    assert results == [{"v": 1}]
@@ -0,0 +1,40 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+
+# The backend app is a directory of top-level modules run from inside it, and
+# some of their names (metrics, main) are also used by the AI service. Put it
+# first on the path and drop any AI service module of the same name that an
+# earlier test directory imported.
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+APP_DIR = os.path.join(ROOT, 'backend', 'app')
+BUNDLED_DB = os.path.join(ROOT, 'data', 'database', 'vitamin_system.db')
+
+sys.path.insert(0, APP_DIR)
+for name in ('main', 'metrics'):
+    sys.modules.pop(name, None)
+
+import migrations  # noqa: E402
+from db import Database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """An empty database migrated to the latest schema"""
+    database = Database(str(tmp_path / 'test.db'))
+    migrations.migrate(database)
+    yield database
+    database.close_all()
+
+
+@pytest.fixture
+def bundled_db(tmp_path):
+    """An unmigrated copy of the database that ships with the repo"""
+    path = str(tmp_path / 'vitamin_system.db')
+    shutil.copyfile(BUNDLED_DB, path)
+    database = Database(path)
+    yield database
+    database.close_all()
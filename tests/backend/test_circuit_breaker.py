@@ -0,0 +1,154 @@
+import time
+
+import pytest
+import requests
+
+from ai_client import AIServiceClient, AIServiceError, CircuitBreaker, CircuitOpenError
+
+
+RESET_TIMEOUT = 0.05
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def wait_for_reset():
+    time.sleep(RESET_TIMEOUT * 1.5)
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=RESET_TIMEOUT)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # a success resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_lets_exactly_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    open_breaker(breaker)
+    wait_for_reset()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_trial_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    open_breaker(breaker)
+    wait_for_reset()
+
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    open_breaker(breaker)
+    wait_for_reset()
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    wait_for_reset()
+    assert breaker.allow()
+
+
+def make_client(send):
+    client = AIServiceClient('http://ai.invalid', {'default': 1}, max_retries=1, retry_backoff=0,
+                             failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    client._send = send
+    return client
+
+
+def test_client_short_circuits_while_open():
+    calls = []
+
+    def send(stage, path, image, filename):
+        calls.append(stage)
+        raise requests.ConnectionError('refused')
+
+    client = make_client(send)
+    for _ in range(2):
+        with pytest.raises(AIServiceError):
+            client.post_image('detect', '/detect', b'img')
+    assert len(calls) == 4  # one retry per call
+
+    with pytest.raises(CircuitOpenError):
+        client.post_image('detect', '/detect', b'img')
+    assert len(calls) == 4
+    stats = client.stats()
+    assert stats['breaker_state'] == CircuitBreaker.OPEN
+    assert stats['stages']['detect']['short_circuited'] == 1
+
+
+@pytest.mark.parametrize('error, retried', [
+    (requests.ConnectionError('refused'), True),
+    (requests.ConnectTimeout('connect timed out'), True),
+    (requests.ReadTimeout('read timed out'), False),
+    (requests.exceptions.ChunkedEncodingError('reply cut short'), False),
+])
+def test_only_unsent_requests_are_retried(error, retried):
+    calls = []
+
+    def send(stage, path, image, filename):
+        calls.append(stage)
+        raise error
+
+    client = make_client(send)
+    with pytest.raises(AIServiceError):
+        client.post_image('analyze', '/analyze', b'img')
+
+    assert len(calls) == (2 if retried else 1)
+    # Either way the call is one breaker failure, not one per attempt
+    assert client.breaker._failures == 1
+
+
+@pytest.mark.parametrize('error, raised', [
+    (requests.Timeout('read timed out'), AIServiceError),
+    (ValueError('not JSON'), AIServiceError),
+    (requests.TooManyRedirects('loop'), AIServiceError),
+    (OSError('upload unreadable'), AIServiceError),
+    (RuntimeError('unexpected'), RuntimeError),
+])
+def test_failed_trial_is_always_released(error, raised):
+    def send(stage, path, image, filename):
+        raise error
+
+    client = make_client(send)
+    open_breaker(client.breaker)
+    wait_for_reset()
+
+    with pytest.raises(raised):
+        client.post_image('detect', '/detect', b'img')
+    # The trial counted as a failure, so the breaker re-opened rather than
+    # staying half-open with its single trial slot taken
+    assert client.breaker.state == CircuitBreaker.OPEN
+    wait_for_reset()
+    assert client.breaker.allow()
+
+
+def test_successful_trial_closes_client_breaker():
+    client = make_client(lambda stage, path, image, filename: {'valid': True})
+    open_breaker(client.breaker)
+    wait_for_reset()
+
+    assert client.post_image('validate', '/validate', b'img') == {'valid': True}
+    assert client.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+import id_allocator
+from db import Database
+
+
+def test_concurrent_allocations_never_overlap(db):
+    threads_count, rounds = 8, 25
+    allocated = []
+    lock = threading.Lock()
+    start = threading.Barrier(threads_count)
+
+    def worker():
+        start.wait()
+        for _ in range(rounds):
+            with db.transaction() as cursor:
+                ids = id_allocator.allocate_patient_ids(cursor, 2)
+            with lock:
+                allocated.extend(ids)
+
+    threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = [id_allocator.format_patient_id(n) for n in range(threads_count * rounds * 2)]
+    assert sorted(allocated) == expected
+
+
+def test_block_is_consecutive(db):
+    with db.transaction() as cursor:
+        assert id_allocator.allocate_patient_ids(cursor) == ['PAVIT-00000']
+        assert id_allocator.allocate_patient_ids(cursor, 3) == [
+            'PAVIT-00001', 'PAVIT-00002', 'PAVIT-00003'
+        ]
+
+
+def test_invalid_count_and_unknown_sequence(db):
+    with db.transaction() as cursor:
+        with pytest.raises(ValueError):
+            id_allocator.allocate(cursor, id_allocator.PATIENT_ID_SEQUENCE, 0)
+        with pytest.raises(LookupError):
+            id_allocator.allocate(cursor, 'missing')
+
+
+def test_seed_starts_after_existing_patients(tmp_path):
+    database = Database(str(tmp_path / 'seed.db'))
+    try:
+        with database.transaction() as cursor:
+            cursor.execute('CREATE TABLE patients (id TEXT PRIMARY KEY, name TEXT)')
+            cursor.executemany('INSERT INTO patients VALUES (?, ?)', [
+                ('PAVIT-00007', 'a'), ('PAVIT-00012', 'b'), ('legacy-1', 'c')
+            ])
+            id_allocator.create_sequence_table(cursor)
+            id_allocator.seed_patient_sequence(cursor)
+            # Seeding again must not reset a sequence that is already in use
+            id_allocator.allocate_patient_ids(cursor)
+            id_allocator.seed_patient_sequence(cursor)
+            assert id_allocator.allocate_patient_ids(cursor) == ['PAVIT-00014']
+    finally:
+        database.close_all()
+
+
+def test_advance_past_skips_caller_chosen_ids(db):
+    with db.transaction() as cursor:
+        id_allocator.advance_past(cursor, 'PAVIT-00041')
+        id_allocator.advance_past(cursor, 'PAVIT-00005')
+        id_allocator.advance_past(cursor, 'clinic-99')
+        assert id_allocator.allocate_patient_ids(cursor) == ['PAVIT-00042']
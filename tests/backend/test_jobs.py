@@ -0,0 +1,167 @@
+import sqlite3
+import threading
+import time
+
+import jobs
+
+
+def wait_for_terminal(queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = queue.get(job_id)
+        if job['status'] in jobs.TERMINAL_STATUSES or time.monotonic() > deadline:
+            return job
+        queue.wait_for_change(0.05)
+
+
+def test_successful_job_stores_its_result(db):
+    queue = jobs.JobQueue(db, lambda payload: {'echo': payload['n']}, poll_interval=0.05)
+    queue.start()
+
+    job = wait_for_terminal(queue, queue.enqueue({'n': 7}))
+    assert job['status'] == jobs.STATUS_SUCCEEDED
+    assert job['result'] == {'echo': 7}
+    assert job['attempts'] == 1
+    assert job['finished_at'] is not None
+
+
+def test_job_error_fails_without_retry(db):
+    calls = []
+
+    def handler(payload):
+        calls.append(payload)
+        raise jobs.JobError('image rejected')
+
+    queue = jobs.JobQueue(db, handler, poll_interval=0.05)
+    queue.start()
+
+    job = wait_for_terminal(queue, queue.enqueue({}))
+    assert job['status'] == jobs.STATUS_FAILED
+    assert job['error'] == 'image rejected'
+    assert len(calls) == 1
+
+
+def test_unexpected_errors_retry_until_max_attempts(db):
+    calls = []
+
+    def handler(payload):
+        calls.append(payload)
+        raise RuntimeError(f"boom {len(calls)}")
+
+    queue = jobs.JobQueue(db, handler, poll_interval=0.01, max_attempts=3)
+    queue.start()
+
+    job = wait_for_terminal(queue, queue.enqueue({}))
+    assert job['status'] == jobs.STATUS_FAILED
+    assert job['error'] == 'boom 3'
+    assert job['attempts'] == 3
+    assert len(calls) == 3
+
+
+def test_retry_waits_for_its_backoff(db):
+    called_at = []
+
+    def handler(payload):
+        called_at.append(time.monotonic())
+        if len(called_at) == 1:
+            raise RuntimeError('flaky')
+        return {}
+
+    queue = jobs.JobQueue(db, handler, workers=1, poll_interval=0.3)
+    queue.start()
+    job_id = queue.enqueue({})
+
+    job = wait_for_terminal(queue, job_id)
+    assert job['status'] == jobs.STATUS_SUCCEEDED
+    assert job['attempts'] == 2
+    # The first attempt's backoff is one poll interval
+    assert called_at[1] - called_at[0] >= 0.25
+
+
+def test_failed_result_write_does_not_rerun_the_handler(db, monkeypatch):
+    calls = []
+    queue = jobs.JobQueue(db, lambda payload: calls.append(payload) or {'ok': True},
+                          workers=1, poll_interval=0.05)
+    finish = queue._finish
+    failures = []
+
+    def flaky_finish(job_id, *args, **kwargs):
+        if not failures:
+            failures.append(job_id)
+            raise sqlite3.OperationalError('database is locked')
+        return finish(job_id, *args, **kwargs)
+
+    monkeypatch.setattr(queue, '_finish', flaky_finish)
+    queue.start()
+
+    job = wait_for_terminal(queue, queue.enqueue({}))
+    assert job['status'] == jobs.STATUS_SUCCEEDED
+    assert job['attempts'] == 1
+    assert len(failures) == 1
+    assert len(calls) == 1
+
+
+def claim_as(db, owner, lease_seconds):
+    """Claim the next job as another process would, returning its ID"""
+    other = jobs.JobQueue(db, None, lease_seconds=lease_seconds)
+    other._owner = owner
+    return other._claim()[0]
+
+
+def test_start_requeues_jobs_whose_lease_expired(db):
+    queue = jobs.JobQueue(db, lambda payload: {'recovered': True}, poll_interval=0.05)
+    job_id = queue.enqueue({})
+    # A process that crashed after claiming stops renewing its lease
+    claim_as(db, 'crashed:1', lease_seconds=-1)
+    assert queue.get(job_id)['status'] == jobs.STATUS_RUNNING
+
+    queue.start()
+    job = wait_for_terminal(queue, job_id)
+    assert job['status'] == jobs.STATUS_SUCCEEDED
+    assert job['attempts'] == 2
+
+
+def test_start_leaves_jobs_of_live_processes_alone(db):
+    calls = []
+    queue = jobs.JobQueue(db, calls.append, poll_interval=0.05)
+    job_id = queue.enqueue({})
+    claim_as(db, 'sibling:2', lease_seconds=60)
+
+    queue.start()
+    queue.wait_for_change(0.3)
+    assert queue.get(job_id)['status'] == jobs.STATUS_RUNNING
+    assert calls == []
+
+
+def test_lease_is_renewed_while_the_handler_runs(db):
+    release = threading.Event()
+    calls = []
+
+    def handler(payload):
+        calls.append(payload)
+        release.wait(5)
+        return {}
+
+    queue = jobs.JobQueue(db, handler, workers=2, poll_interval=0.05, lease_seconds=0.3)
+    queue.start()
+    job_id = queue.enqueue({})
+
+    # Several lease periods pass; the job must not be handed to the other worker
+    time.sleep(1.0)
+    assert queue.get(job_id)['status'] == jobs.STATUS_RUNNING
+    release.set()
+
+    job = wait_for_terminal(queue, job_id)
+    assert job['status'] == jobs.STATUS_SUCCEEDED
+    assert job['attempts'] == 1
+    assert len(calls) == 1
+
+
+def test_start_is_idempotent(db):
+    queue = jobs.JobQueue(db, lambda payload: {}, workers=2, poll_interval=0.05)
+    queue.start()
+    threads = list(queue._threads)
+    queue.start()
+
+    assert queue._threads == threads
+    assert [thread.name for thread in threads] == ['job-heartbeat', 'job-worker-0', 'job-worker-1']
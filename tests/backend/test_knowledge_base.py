@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from knowledge_base import KnowledgeBase
+
+
+MAPPING_HEADER = 'disease_name,vitamin,association_strength,confidence_note,source_type\n'
+NUTRITION_HEADER = 'vitamin,foods,notes\n'
+
+
+def write(path, content):
+    # Bump the mtime explicitly so back-to-back rewrites are always noticed
+    previous = os.stat(path).st_mtime_ns if path.exists() else 0
+    if isinstance(content, bytes):
+        path.write_bytes(content)
+    else:
+        path.write_text(content)
+    os.utime(path, ns=(previous + 10**9, previous + 10**9))
+
+
+@pytest.fixture
+def files(tmp_path):
+    mapping = tmp_path / 'disease_vitamin_mapping.csv'
+    nutrition = tmp_path / 'vitamin_nutrition.csv'
+    write(mapping, MAPPING_HEADER
+          + 'rickets,Vitamin D,high,Classic deficiency,medical_textbook\n'
+          + 'acne,Vitamin A,medium,Retinoids,clinical_observation\n'
+          + 'acne,Vitamin E,high,Antioxidant,research\n')
+    write(nutrition, NUTRITION_HEADER + 'Vitamin D,Fatty fish;Egg yolk,Sunlight helps\n')
+    return mapping, nutrition
+
+
+@pytest.fixture
+def kb(files):
+    return KnowledgeBase(str(files[0]), str(files[1]), check_interval=0)
+
+
+def test_lookups_are_indexed_and_ranked(kb):
+    assert [v['vitamin'] for v in kb.vitamins_for('Acne')] == ['Vitamin E', 'Vitamin A']
+    assert kb.vitamins_for('rickets')[0]['association_strength'] == 0.9
+    assert kb.vitamins_for('unknown') == []
+    assert kb.nutrition_for('Vitamin D') == {'foods': ['Fatty fish', 'Egg yolk'], 'notes': 'Sunlight helps'}
+    assert kb.nutrition_for('Vitamin A') is None
+
+
+def test_returned_entries_do_not_alias_the_index(kb):
+    kb.vitamins_for('rickets')[0]['vitamin'] = 'changed'
+    assert kb.vitamins_for('rickets')[0]['vitamin'] == 'Vitamin D'
+
+
+def test_rewritten_file_is_picked_up(kb, files):
+    mapping, nutrition = files
+    old = kb.snapshot()
+
+    write(mapping, MAPPING_HEADER + 'scurvy,Vitamin C,high,Collagen synthesis,medical_textbook\n')
+    write(nutrition, NUTRITION_HEADER + 'Vitamin C,Oranges;Peppers,Heat destroys it\n')
+
+    new = kb.snapshot()
+    assert new is not old
+    assert new.version != old.version
+    assert [v['vitamin'] for v in kb.vitamins_for('scurvy')] == ['Vitamin C']
+    assert kb.vitamins_for('rickets') == []
+    assert kb.nutrition_for('Vitamin C')['foods'] == ['Oranges', 'Peppers']
+    # The old snapshot is immutable; readers holding it are unaffected
+    assert 'rickets' in old.disease_index
+
+
+def test_unchanged_stat_skips_the_read(kb, monkeypatch):
+    kb.snapshot()
+    reads = []
+    read = kb._read
+    monkeypatch.setattr(kb, '_read', lambda path: reads.append(path) or read(path))
+
+    kb.snapshot()
+    assert reads == []
+
+
+def test_touched_file_with_same_content_keeps_the_snapshot(kb, files):
+    mapping, _ = files
+    old = kb.snapshot()
+
+    write(mapping, mapping.read_text())
+
+    assert kb.snapshot() is old
+
+
+@pytest.mark.parametrize('content', [
+    'disease,vitamin\nrickets,Vitamin D\n',  # missing columns
+    b'\xff\xfe not utf-8',
+])
+def test_malformed_file_keeps_the_previous_snapshot(kb, files, content):
+    mapping, _ = files
+    old = kb.snapshot()
+
+    write(mapping, content)
+
+    assert kb.snapshot() is old
+    assert kb.vitamins_for('rickets')[0]['vitamin'] == 'Vitamin D'
+
+
+def test_deleted_file_keeps_the_previous_snapshot(kb, files):
+    mapping, _ = files
+    old = kb.snapshot()
+
+    mapping.unlink()
+
+    assert kb.snapshot() is old
+
+
+def test_first_load_failure_is_raised(tmp_path):
+    kb = KnowledgeBase(str(tmp_path / 'missing.csv'), str(tmp_path / 'missing.csv'))
+    with pytest.raises(OSError):
+        kb.snapshot()
@@ -0,0 +1,79 @@
+import json
+
+import migrations
+import report_vitamins
+
+
+def legacy_reports(db):
+    rows = db.query('''
+        SELECT id, patient_id, detected_disease, vitamin_deficiencies, nutrition_recommendations
+        FROM reports ORDER BY id
+    ''')
+    return [
+        (report_id, patient_id, disease, json.loads(vitamins or '[]'), json.loads(recs or '[]'))
+        for report_id, patient_id, disease, vitamins, recs in rows
+    ]
+
+
+def test_bundled_database_migrates_to_latest(bundled_db):
+    before = legacy_reports(bundled_db)
+    assert before, 'the bundled database should ship with reports'
+
+    assert migrations.migrate(bundled_db) == migrations.MIGRATIONS[-1][0]
+
+    applied = [row[0] for row in bundled_db.query('SELECT version FROM schema_migrations ORDER BY version')]
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert bundled_db.query_one('SELECT COUNT(*) FROM reports')[0] == len(before)
+
+
+def test_migrate_is_idempotent(bundled_db):
+    latest = migrations.migrate(bundled_db)
+    snapshot = bundled_db.query('SELECT * FROM report_vitamins ORDER BY report_id, position')
+
+    assert migrations.migrate(bundled_db) == latest
+    assert bundled_db.query('SELECT * FROM report_vitamins ORDER BY report_id, position') == snapshot
+
+
+def test_legacy_vitamins_survive_conversion(bundled_db):
+    before = legacy_reports(bundled_db)
+    migrations.migrate(bundled_db)
+
+    converted = {}
+    for patient_id in {row[1] for row in before}:
+        converted.update(report_vitamins.load_for_patient(bundled_db, patient_id))
+
+    for report_id, _, _, vitamins, recommendations in before:
+        deficiencies, advice = converted.get(report_id, ([], []))
+        listed = [vit_info['vitamin'] for vit_info in vitamins]
+        assert [vit_info['vitamin'] for vit_info in deficiencies][:len(listed)] == listed
+        assert [(rec['vitamin'], rec['foods']) for rec in advice] == [
+            (rec['vitamin'], rec['foods']) for rec in recommendations
+        ]
+
+    # The blobs are cleared once their rows have moved
+    assert bundled_db.query_one('''
+        SELECT COUNT(*) FROM reports
+        WHERE vitamin_deficiencies IS NOT NULL OR nutrition_recommendations IS NOT NULL
+    ''')[0] == 0
+
+
+def test_reports_without_a_patient_migrate(bundled_db):
+    bundled_db.execute('''
+        INSERT INTO reports (patient_id, detected_disease, nutrition_recommendations)
+        VALUES (NULL, 'acne', '[{"vitamin": "Vitamin A", "foods": ["Carrots"]}]')
+    ''')
+
+    assert migrations.migrate(bundled_db) == migrations.MIGRATIONS[-1][0]
+    assert bundled_db.query_one(
+        'SELECT COUNT(*) FROM patient_disease_counts WHERE patient_id IS NULL'
+    )[0] == 0
+
+
+def test_route_queries_use_indexes(bundled_db):
+    migrations.migrate(bundled_db)
+    assert migrations.check_query_plans(bundled_db) == {}
+
+
+def test_empty_database_migrates(db):
+    assert migrations.current_version(db) == migrations.MIGRATIONS[-1][0]
+    assert migrations.check_query_plans(db) == {}
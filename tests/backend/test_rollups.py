@@ -0,0 +1,61 @@
+import migrations
+import report_vitamins
+import rollups
+
+
+ROLLUP_TABLES = ('patient_vitamin_counts', 'patient_disease_counts', 'patient_monthly_counts')
+
+
+def snapshot(cursor):
+    return {
+        table: sorted(cursor.execute(f'SELECT * FROM {table}').fetchall())
+        for table in ROLLUP_TABLES
+    }
+
+
+def advice(vitamin):
+    return {'vitamin': vitamin, 'foods': ['Eggs', 'Milk'], 'notes': 'n'}
+
+
+def store_report(cursor, patient_id, disease, vitamins, recommendations, created_at):
+    # Mirrors main.store_report, with an explicit created_at to span months
+    cursor.execute('''
+        INSERT INTO reports (patient_id, detected_disease, confidence_score, created_at)
+        VALUES (?, ?, ?, ?)
+    ''', (patient_id, disease, 0.9, created_at))
+    report_vitamins.insert(cursor, cursor.lastrowid, vitamins, recommendations)
+    rollups.record_report(cursor, patient_id, disease, recommendations, created_at)
+
+
+def test_backfill_matches_incremental_counts(db):
+    vitamin_a = {'vitamin': 'Vitamin A'}
+    vitamin_d = {'vitamin': 'Vitamin D'}
+    with db.transaction() as cursor:
+        store_report(cursor, 'PAVIT-00000', 'acne', [vitamin_a, vitamin_d],
+                     [advice('Vitamin A'), advice('Vitamin D')], '2026-01-03 10:00:00')
+        store_report(cursor, 'PAVIT-00000', 'acne', [vitamin_a], [advice('Vitamin A')],
+                     '2026-01-20 10:00:00')
+        # Vitamin D without advice is listed but not counted
+        store_report(cursor, 'PAVIT-00000', 'eczema', [vitamin_d], [], '2026-02-01 10:00:00')
+        store_report(cursor, 'PAVIT-00001', None, [], [], '2026-02-14 10:00:00')
+        incremental = snapshot(cursor)
+
+        assert rollups.backfill(cursor) == 4
+        assert snapshot(cursor) == incremental
+
+    analytics = rollups.patient_analytics(db, 'PAVIT-00000')
+    assert analytics == {
+        'vitamins': {'Vitamin A': 2, 'Vitamin D': 1},
+        'diseases': {'acne': 2, 'eczema': 1},
+        'monthly': {'2026-01': 2, '2026-02': 1}
+    }
+
+
+def test_bundled_database_rollups_match_backfill(bundled_db):
+    migrations.migrate(bundled_db)
+    with bundled_db.transaction() as cursor:
+        migrated = snapshot(cursor)
+        assert any(migrated.values())
+
+        rollups.backfill(cursor)
+        assert snapshot(cursor) == migrated